@@ -0,0 +1,215 @@
+import argparse
+import math
+import os
+import tempfile
+import time
+from typing import NamedTuple
+
+import cv2
+import numpy
+
+from main import DetectionParameters, StageTimer, ThresholdStrategy, apply_matrix, calculate_transform, distance, \
+    find_marks
+
+MAT_WIDTH = 296.7
+MAT_HEIGHT = 301
+MARKS = [(10, 10), (200, 10), (10, 287), (200, 287)]
+PAGE = [(0, 0), (210, 0), (0, 297), (210, 297)]
+MARK_THICKNESS = 0.47
+MARK_GAP = 0.085
+STAGES = ["load", "prepare", "coarse", "refine", "full", *ThresholdStrategy, "transform"]
+
+
+class Distortion(NamedTuple):
+    rotation: float = 0.0
+    skew: float = 0.0
+    blur: float = 0.0
+    quality: int | None = None
+
+    def describe(self) -> str:
+        parts = []
+        if self.rotation:
+            parts.append("rot {0:g}°".format(self.rotation))
+        if self.skew:
+            parts.append("skew {0:g}°".format(self.skew))
+        if self.blur:
+            parts.append("blur {0:g}".format(self.blur))
+        if self.quality is not None:
+            parts.append("jpeg {0}".format(self.quality))
+        return ", ".join(parts) or "clean"
+
+
+DISTORTIONS = [
+    Distortion(),
+    Distortion(rotation=0.5),
+    Distortion(rotation=-1.0, skew=0.3),
+    Distortion(blur=1.5),
+    Distortion(quality=60),
+    Distortion(rotation=0.7, skew=0.2, blur=1.0, quality=70),
+]
+
+
+class Case(NamedTuple):
+    dpi: int
+    mark: str
+    distortion: Distortion
+
+
+class Result(NamedTuple):
+    case: Case
+    pixels: int
+    error: float | None
+    seconds: float
+    timings: dict[str, float]
+    strategy: str | None
+
+
+def page_transform(distortion: Distortion, offset: (float, float)) -> numpy.ndarray:
+    angle = math.radians(distortion.rotation)
+    rotate = numpy.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+    shear = numpy.array([[1, math.tan(math.radians(distortion.skew))], [0, 1]])
+    linear = rotate @ shear
+    center = numpy.array([105, 148.5])
+    return numpy.hstack((linear, (center + offset - linear @ center).reshape(2, 1)))
+
+
+def corner_mark(corner: (float, float), size: float, thickness: float, direction: (int, int)) -> list[(float, float)]:
+    x, y = corner
+    dx, dy = direction
+    return [
+        (x, y),
+        (x + dx * size, y),
+        (x + dx * size, y + dy * thickness),
+        (x + dx * thickness, y + dy * thickness),
+        (x + dx * thickness, y + dy * size),
+        (x, y + dy * size),
+    ]
+
+
+def mark_polygons(mark: str, center: (float, float), direction: (int, int), parameters: DetectionParameters):
+    cx, cy = center
+    thickness = MARK_THICKNESS
+    if mark == "double":
+        size = MAT_WIDTH * parameters.double_size
+        dx, dy = direction
+        return [corner_mark((cx - dx * size / 2, cy - dy * size / 2), size, thickness, direction)]
+    size = MAT_WIDTH * parameters.single_size
+    reach = size + thickness
+    top = cy - reach / 2
+    return [
+        corner_mark((cx - reach - MARK_GAP, top), size, thickness, (1, 1)),
+        corner_mark((cx + reach + MARK_GAP, top), size, thickness, (-1, 1)),
+    ]
+
+
+def render_scan(
+        case: Case,
+        parameters: DetectionParameters,
+        rng: numpy.random.Generator,
+) -> (numpy.ndarray, (float, float, float, float, float, float)):
+    per_mm = case.dpi / 25.4
+    width = int(round(MAT_WIDTH * per_mm))
+    height = int(round(MAT_HEIGHT * per_mm))
+    transform = page_transform(case.distortion, rng.uniform((5, 2), (60, 3)))
+
+    def to_mat(points) -> numpy.ndarray:
+        points = numpy.asarray(points, dtype=numpy.float64)
+        return points @ transform[:, :2].T + transform[:, 2]
+
+    image = numpy.full((height, width), 255, numpy.uint8)
+    directions = [(1, 1), (-1, 1), (1, -1), (-1, -1)]
+    for center, direction in zip(MARKS, directions):
+        for polygon in mark_polygons(case.mark, center, direction, parameters):
+            points = numpy.round(to_mat(polygon) * per_mm * 16).astype(numpy.int32)
+            cv2.fillPoly(image, [points], 0, lineType=cv2.LINE_AA, shift=4)
+    if case.distortion.blur:
+        image = cv2.GaussianBlur(image, (0, 0), case.distortion.blur)
+
+    truth = [(x / MAT_WIDTH, y / MAT_HEIGHT) for (x, y) in to_mat(MARKS)]
+    return image, calculate_transform(truth)
+
+
+def transform_error(
+        transform: (float, float, float, float, float, float),
+        truth: (float, float, float, float, float, float),
+) -> float:
+    return max(distance(apply_matrix(point, transform), apply_matrix(point, truth)) for point in PAGE + MARKS)
+
+
+def run_case(case: Case, parameters: DetectionParameters, directory: str, repeat: int, seed: int) -> Result:
+    image, truth = render_scan(case, parameters, numpy.random.default_rng(seed))
+    if case.distortion.quality is None:
+        path = os.path.join(directory, "scan.png")
+        cv2.imwrite(path, image)
+    else:
+        path = os.path.join(directory, "scan.jpg")
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, case.distortion.quality])
+
+    timer = StageTimer()
+    error = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            marks = find_marks(path, parameters, timer)
+            with timer.stage("transform"):
+                transform = calculate_transform(marks)
+            error = transform_error(transform, truth)
+        except Exception:
+            error = None
+    seconds = (time.perf_counter() - start) / repeat
+    timings = {name: value / repeat for (name, value) in timer.timings.items()}
+    strategy = None
+    if error is not None:
+        strategy = [strategy for strategy in parameters.cascade if strategy in timings][-1]
+    return Result(case, image.size, error, seconds, timings, strategy)
+
+
+def format_result(result: Result) -> str:
+    case = result.case
+    error = "FAILED" if result.error is None else "{0:.3f}".format(result.error)
+    stages = " ".join("{0:>7.1f}".format(result.timings.get(stage, 0.0) * 1000) for stage in STAGES)
+    return "{0:>4} {1:<6} {2:<34} {3:>9} {4:<8} {5:>8.1f} {6:>7.1f} {7}".format(
+        case.dpi, case.mark, case.distortion.describe(), error, result.strategy or "-",
+        result.seconds * 1000, result.pixels / result.seconds / 1e6, stages,
+    )
+
+
+def run_benchmark(
+        dpis: list[int],
+        marks: list[str],
+        distortions: list[Distortion] = DISTORTIONS,
+        parameters: DetectionParameters = DetectionParameters(),
+        repeat: int = 3,
+        seed: int = 0,
+) -> list[Result]:
+    results = []
+    print("{0:>4} {1:<6} {2:<34} {3:>9} {4:<8} {5:>8} {6:>7} {7}".format(
+        "dpi", "mark", "distortion", "error mm", "stage", "ms", "MPix/s", " ".join("{0:>7}".format(stage) for stage in STAGES)
+    ))
+    with tempfile.TemporaryDirectory() as directory:
+        for dpi in dpis:
+            for mark in marks:
+                for distortion in distortions:
+                    result = run_case(Case(dpi, mark, distortion), parameters, directory, repeat, seed)
+                    print(format_result(result), flush=True)
+                    results.append(result)
+    failed = sum(1 for result in results if result.error is None)
+    errors = [result.error for result in results if result.error is not None]
+    seconds = sum(result.seconds for result in results)
+    print("{0} cases, {1} failed, max error {2:.3f} mm, {3:.2f} scans/s".format(
+        len(results), failed, max(errors, default=0.0), len(results) / seconds
+    ))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dpi", type=int, nargs="+", default=[300, 600])
+    parser.add_argument("--mark", nargs="+", choices=["double", "single"], default=["double", "single"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--full-page", action="store_true")
+    parser.add_argument("--no-coarse", action="store_true")
+    args = parser.parse_args()
+    parameters = DetectionParameters(corners=not args.full_page, coarse_width=0 if args.no_coarse else 1800)
+    run_benchmark(args.dpi, args.mark, parameters=parameters, repeat=args.repeat, seed=args.seed)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+from typing import NamedTuple
+
+CACHE_VERSION = 1
+
+
+class CacheEntry(NamedTuple):
+    marks: list[tuple[float, float]]
+    transform: tuple[float, float, float, float, float, float]
+
+
+def default_cache_path(*names: str) -> str:
+    path = os.getenv("FCM_CACHE_PATH")
+    if not path:
+        base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "svg-scan-matching")
+    return os.path.join(path, *names)
+
+
+class JsonStore:
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, source: str, *parameters) -> str:
+        digest = hashlib.sha256()
+        with open(source, "rb") as reader:
+            for chunk in iter(lambda: reader.read(2 ** 20), b""):
+                digest.update(chunk)
+        digest.update(repr(parameters).encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, key: str):
+        path = self.path(key)
+        try:
+            with open(path) as reader:
+                data = json.load(reader)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def store(self, key: str, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temporary = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temporary, "w") as writer:
+            json.dump(data, writer)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+        total = 0
+        for (_, size, path) in entries:
+            total += size
+            if total > self.max_size:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class MarkCache(JsonStore):
+    def __init__(self, directory: str, max_size: int = 64 * 2 ** 20):
+        super().__init__(directory, max_size)
+
+    def key(self, scan: str, parameters: NamedTuple) -> str:
+        return super().key(scan, CACHE_VERSION, parameters)
+
+    def get(self, key: str) -> CacheEntry | None:
+        data = self.load(key)
+        if data is None:
+            return None
+        return CacheEntry([tuple(mark) for mark in data["marks"]], tuple(data["transform"]))
+
+    def put(self, key: str, entry: CacheEntry):
+        self.store(key, {
+            "marks": [[float(x), float(y)] for (x, y) in entry.marks],
+            "transform": [float(value) for value in entry.transform],
+        })
@@ -1,58 +1,158 @@
+import argparse
+import enum
+import json
+import logging
 import math
+import resource
 import sys
-from typing import Sequence
-from xml.dom.minidom import parse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Sequence
 
 import os
 import cv2
 import numpy
 
-DEBUGPATH = os.getenv("FCM_DEBUG_PATH")
+from cache import CacheEntry, MarkCache, default_cache_path
+from rewrite import prepare_cut, write_cut
 
-def close_enough(a, b):
-    return min(a, b) / max(a, b) > 0.7
+DEBUGPATH = os.getenv("FCM_DEBUG_PATH")
+MATRIX_DECIMALS = 6
+
+class ThresholdStrategy(enum.StrEnum):
+    FIXED = "fixed"
+    OTSU = "otsu"
+    ADAPTIVE = "adaptive"
+
+
+class MarksNotFoundError(Exception):
+    def __init__(self, message: str, detection=None):
+        super().__init__(message)
+        self.detection = detection
+
+
+class DetectionParameters(NamedTuple):
+    tolerance: float = 0.7
+    perimeter_factor: float = 2.2
+    area_factor: float = 1 / 320
+    single_size: float = 1 / 60
+    double_size: float = 1 / 30
+    corners: bool = True
+    corner_width: float = 0.5
+    corner_height: float = 0.15
+    coarse_width: int = 1800
+    refine_margin: float = 1.0
+    adaptive_block: float = 1 / 55
+    merge_distance: float = 1 / 500
+    threshold: ThresholdStrategy = ThresholdStrategy.FIXED
+    cascade: tuple[ThresholdStrategy, ...] = (
+        ThresholdStrategy.FIXED,
+        ThresholdStrategy.OTSU,
+        ThresholdStrategy.ADAPTIVE,
+    )
 
 
-def find_contours(image: cv2.typing.MatLike) -> Sequence[cv2.typing.MatLike]:
-    image_grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    image_grayscale = cv2.bitwise_not(image_grayscale)
-    ret, thresh = cv2.threshold(image_grayscale, 60, 255, 0)
-    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+Window = tuple[int, int, int, int]
+
+
+def close_enough(a, b, tolerance: float = 0.7):
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.minimum(a, b) / numpy.maximum(a, b) > tolerance
+
+
+def threshold_image(
+        image: cv2.typing.MatLike,
+        width: int,
+        parameters: DetectionParameters,
+        buffer: cv2.typing.MatLike | None = None,
+) -> cv2.typing.MatLike:
+    if parameters.threshold == ThresholdStrategy.OTSU:
+        ret, thresh = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU, dst=buffer)
+    elif parameters.threshold == ThresholdStrategy.ADAPTIVE:
+        block_size = max(3, int(width * parameters.adaptive_block) | 1)
+        thresh = cv2.adaptiveThreshold(
+            image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block_size, 10, dst=buffer
+        )
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, dst=thresh)
+        thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, dst=thresh)
+    else:
+        ret, thresh = cv2.threshold(image, 255 - 61, 255, cv2.THRESH_BINARY_INV, dst=buffer)
+    return thresh
+
+
+def find_contours(
+        image: cv2.typing.MatLike,
+        width: int,
+        offset: (int, int) = (0, 0),
+        buffer: cv2.typing.MatLike | None = None,
+        parameters: DetectionParameters = DetectionParameters(),
+) -> Sequence[cv2.typing.MatLike]:
+    thresh = threshold_image(image, width, parameters, buffer)
+    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
     return contours
 
 
-def prefilter_double(shape: numpy.shape, contour: cv2.typing.MatLike) -> bool:
-    area = cv2.contourArea(contour)
-    _, _, w, h = cv2.boundingRect(contour)
-    contour_length = cv2.arcLength(contour, True)
-    if 0 in [w, h, area, contour_length]:
-        return False
-    if not close_enough(contour_length, w * 2.2 + h * 2.2):
-        return False
-    if not close_enough(w, h):
-        return False
-    if not close_enough(area, w * 11):
-        return False
-    if not close_enough(w, shape[1] / 30):
-        return False
-    return True
-
-
-def prefilter_single(shape: numpy.shape, contour: cv2.typing.MatLike) -> bool:
-    area = cv2.contourArea(contour)
-    _, _, w, h = cv2.boundingRect(contour)
-    contour_length = cv2.arcLength(contour, True)
-    if 0 in [w, h, area, contour_length]:
-        return False
-    if not close_enough(contour_length, w * 2.2 + h * 2.2):
-        return False
-    if not close_enough(w, h):
-        return False
-    if not close_enough(area, w * 11):
-        return False
-    if not close_enough(w, shape[1] / 60):
-        return False
-    return True
+def contour_features(contours: Sequence[cv2.typing.MatLike]) -> numpy.ndarray:
+    features = numpy.zeros((len(contours), 4))
+    for index, contour in enumerate(contours):
+        _, _, w, h = cv2.boundingRect(contour)
+        features[index] = (cv2.contourArea(contour), w, h, cv2.arcLength(contour, True))
+    return features
+
+
+def prefilter(features: numpy.ndarray, width: int, size: float, parameters: DetectionParameters) -> numpy.ndarray:
+    area, w, h, contour_length = features.T
+    return (
+        (area > 0) & (w > 0) & (h > 0) & (contour_length > 0)
+        & close_enough(contour_length, (w + h) * parameters.perimeter_factor, parameters.tolerance)
+        & close_enough(w, h, parameters.tolerance)
+        & close_enough(area, w * width * parameters.area_factor, parameters.tolerance)
+        & close_enough(w, size, parameters.tolerance)
+    )
+
+
+def prefilter_double(shape: numpy.shape, features: numpy.ndarray, parameters: DetectionParameters) -> numpy.ndarray:
+    return prefilter(features, shape[1], shape[1] * parameters.double_size, parameters)
+
+
+def prefilter_single(shape: numpy.shape, features: numpy.ndarray, parameters: DetectionParameters) -> numpy.ndarray:
+    return prefilter(features, shape[1], shape[1] * parameters.single_size, parameters)
+
+
+def select(contours: Sequence[cv2.typing.MatLike], mask: numpy.ndarray) -> list[cv2.typing.MatLike]:
+    return [contours[index] for index in numpy.flatnonzero(mask)]
+
+
+def detection_windows(shape: numpy.shape, parameters: DetectionParameters) -> Iterator[list[Window]]:
+    height, width = shape[:2]
+    corner_width = int(width * parameters.corner_width)
+    corner_height = int(height * parameters.corner_height)
+    if parameters.corners and (corner_width * 2 < width or corner_height * 2 < height):
+        yield [
+            (0, 0, corner_width, corner_height),
+            (width - corner_width, 0, corner_width, corner_height),
+            (0, height - corner_height, corner_width, corner_height),
+            (width - corner_width, height - corner_height, corner_width, corner_height),
+        ]
+    yield [(0, 0, width, height)]
+
+
+def find_candidates(
+        image: cv2.typing.MatLike,
+        windows: list[Window],
+        parameters: DetectionParameters,
+) -> (list[cv2.typing.MatLike], list[cv2.typing.MatLike]):
+    contours_single = []
+    contours_double = []
+    buffer = numpy.empty((max(h for (_, _, _, h) in windows), max(w for (_, _, w, _) in windows)), numpy.uint8)
+    for (x, y, w, h) in windows:
+        candidates = find_contours(image[y:y + h, x:x + w], image.shape[1], (x, y), buffer[:h, :w], parameters)
+        features = contour_features(candidates)
+        contours_single += select(candidates, prefilter_single(image.shape, features, parameters))
+        contours_double += select(candidates, prefilter_double(image.shape, features, parameters))
+    return contours_single, contours_double
 
 
 def distance(point1, point2):
@@ -61,61 +161,60 @@ def distance(point1, point2):
     return math.sqrt(math.pow(x1 - x2, 2) + math.pow(y2 - y1, 2))
 
 
-def marks_match(mark1, mark2):
-    for point1 in mark1:
-        for point2 in mark2:
-            if distance(point1, point2) < 5:
-                return [point1, point2]
-    return None
+def matching_pairs(cluster: Sequence[numpy.array], threshold: float) -> list[(float, int, int)]:
+    vertices = numpy.asarray(cluster, dtype=numpy.float64).reshape(-1, 2)
+    owners = numpy.repeat(numpy.arange(len(cluster)), 3).tolist()
+    cells = numpy.floor(vertices / threshold).astype(numpy.int64).tolist()
+    vertices = vertices.tolist()
+    grid: dict[(int, int), list[int]] = {}
+    for index, (x, y) in enumerate(cells):
+        grid.setdefault((x, y), []).append(index)
+
+    pairs: dict[(int, int), float] = {}
+    for index, (x, y) in enumerate(cells):
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in grid.get((x + dx, y + dy), ()):
+                    el1, el2 = owners[index], owners[other]
+                    if el1 >= el2:
+                        continue
+                    match = distance(vertices[index], vertices[other])
+                    if match < threshold and match < pairs.get((el1, el2), threshold):
+                        pairs[(el1, el2)] = match
+    return sorted(
+        (match, el1, el2) for ((el1, el2), match) in pairs.items()
+        if not numpy.array_equal(cluster[el1], cluster[el2])
+    )
 
 
 def find_center(points, index):
     return sorted(point[index] for point in points)[1:3]
 
 
-def merge_cluster(cluster: Sequence[numpy.array]) -> numpy.array:
-    for el1 in cluster:
-        for el2 in cluster:
-            if numpy.array_equal(el1, el2):
-                continue
-            match = marks_match(el1, el2)
-            if match is None:
-                continue
-            return cv2.boxPoints(cv2.minAreaRect(numpy.array(el1 + el2)))
-    return None
+def merge_cluster(cluster: Sequence[numpy.array], threshold: float) -> numpy.array:
+    pairs = matching_pairs(cluster, threshold)
+    if len(pairs) == 0:
+        return None
+    _, el1, el2 = pairs[0]
+    return cv2.boxPoints(cv2.minAreaRect(numpy.concatenate((cluster[el1], cluster[el2])).astype(numpy.float32)))
 
 
-def merge_clusters(candidates: list[list[(float, float)]]):
-    xs = [point[0] for el in candidates for point in el]
-    ys = [point[1] for el in candidates for point in el]
-    if len(xs) == 0 or len(ys) == 0:
+def merge_clusters(candidates: list[list[(float, float)]], threshold: float):
+    if len(candidates) == 0:
         return []
 
-    min_x = min(xs)
-    max_x = max(xs)
-    min_y = min(ys)
-    max_y = max(ys)
-    threshold_x = (min_x + max_x) / 2
-    threshold_y = (min_y + max_y) / 2
-
-    top_left = [el for el in candidates
-                if all(point[0] < threshold_x for point in el)
-                and all(point[1] < threshold_y for point in el)]
-    top_right = [el for el in candidates
-                 if all(point[0] > threshold_x for point in el)
-                 and all(point[1] < threshold_y for point in el)]
-    bottom_left = [el for el in candidates
-                   if all(point[0] < threshold_x for point in el)
-                   and all(point[1] > threshold_y for point in el)]
-    bottom_right = [el for el in candidates
-                    if all(point[0] > threshold_x for point in el)
-                    and all(point[1] > threshold_y for point in el)]
+    points = numpy.asarray(candidates, dtype=numpy.float64)
+    threshold_x, threshold_y = (points.min(axis=(0, 1)) + points.max(axis=(0, 1))) / 2
+    left = (points[:, :, 0] < threshold_x).all(axis=1)
+    right = (points[:, :, 0] > threshold_x).all(axis=1)
+    top = (points[:, :, 1] < threshold_y).all(axis=1)
+    bottom = (points[:, :, 1] > threshold_y).all(axis=1)
 
     marks = [
-        merge_cluster(top_left),
-        merge_cluster(top_right),
-        merge_cluster(bottom_left),
-        merge_cluster(bottom_right),
+        merge_cluster(select(candidates, top & left), threshold),
+        merge_cluster(select(candidates, top & right), threshold),
+        merge_cluster(select(candidates, bottom & left), threshold),
+        merge_cluster(select(candidates, bottom & right), threshold),
     ]
 
     return [mark for mark in marks if mark is not None]
@@ -164,7 +263,7 @@ def process_candidates(candidates: list[list[(float, float)]]) -> list[(float, f
 
 def to_mm(shape: numpy.shape, point: (float, float)) -> (float, float):
     x, y = point
-    height, width, _ = shape
+    height, width = shape[:2]
     return x / width, y / height
 
 
@@ -186,59 +285,202 @@ def simplify_double(contour: numpy.array) -> numpy.array:
 
 
 def add_border(image: cv2.typing.MatLike):
-    for y in range(0, image.shape[0]):
-        image[y, 0] = (255, 255, 255)
-    for x in range(0, image.shape[1]):
-        image[0, x] = (255, 255, 255)
-    for y in range(0, image.shape[0]):
-        image[y, image.shape[1] - 1] = (255, 255, 255)
-    for x in range(0, image.shape[1]):
-        image[image.shape[0] - 1, x] = (255, 255, 255)
-
-
-def find_marks(file: str) -> [(float, float), (float, float), (float, float), (float, float)]:
-    scan = cv2.imread(file)
-    if DEBUGPATH != "":
-        dbgScan = cv2.cvtColor(scan, cv2.COLOR_BGR2GRAY)
-        dbgScan = cv2.cvtColor(dbgScan, cv2.COLOR_GRAY2RGB)
-
-    add_border(scan)
-    candidates = find_contours(scan)
-    contours_single = [cnt for cnt in candidates if prefilter_single(scan.shape, cnt)]
-    contours_double = [cnt for cnt in candidates if prefilter_double(scan.shape, cnt)]
-    shapes_single = [simplify_single(cnt) for cnt in contours_single]
-    shapes_double = [simplify_double(cnt) for cnt in contours_double]
+    image[:, 0] = 255
+    image[0, :] = 255
+    image[:, -1] = 255
+    image[-1, :] = 255
 
-    if DEBUGPATH is not None:
-        dbg = dbgScan.copy()
-        cv2.drawContours(dbg, contours_single, -1, (0, 0, 255), 2)
-        cv2.drawContours(dbg, contours_double, -1, (255, 0, 0), 2)
-        for tri in shapes_single:
-            cv2.drawContours(dbg, [numpy.intp(tri)], -1, (0, 255, 255), 2)
-        for rect in shapes_double:
-            cv2.drawContours(dbg, [numpy.intp(rect)], -1, (0, 255, 255), 2)
-        cv2.imwrite(DEBUGPATH+"/contours_1.jpg", dbg)
 
-    marks = process_candidates(shapes_double + merge_clusters(shapes_single))
+def load_scan(file: str) -> cv2.typing.MatLike:
+    scan = cv2.imread(file, cv2.IMREAD_GRAYSCALE)
+    if scan is None:
+        raise Exception("can't read scan: " + file)
+    return scan
 
-    if DEBUGPATH is not None:
-        dbg = dbgScan.copy()
-        for ((x1, x2), (y1, y2)) in marks:
-            cv2.rectangle(dbg, numpy.intp((x1, y1)), numpy.intp((x2, y2)), (0, 255, 0), 2)
-        cv2.imwrite(DEBUGPATH+"/contours_2.jpg", dbg)
 
-    marks = sort_marks(marks)
+class StageTimer:
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
 
-    if DEBUGPATH is not None:
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Detection(NamedTuple):
+    contours_single: list[cv2.typing.MatLike]
+    contours_double: list[cv2.typing.MatLike]
+    shapes_single: list[numpy.array]
+    shapes_double: list[numpy.array]
+    marks: list[((float, float), (float, float))]
+
+
+def detect_marks(
+        image: cv2.typing.MatLike,
+        windows: list[Window],
+        parameters: DetectionParameters,
+        merge=merge_clusters,
+) -> Detection:
+    contours_single, contours_double = find_candidates(image, windows, parameters)
+    shapes_single = [simplify_single(cnt) for cnt in contours_single]
+    shapes_double = [simplify_double(cnt) for cnt in contours_double]
+    marks = process_candidates(shapes_double + merge(shapes_single, image.shape[1] * parameters.merge_distance))
+    return Detection(contours_single, contours_double, shapes_single, shapes_double, marks)
+
+
+def consistent_marks(marks: list[((float, float), (float, float))]) -> list[((float, float), (float, float))] | None:
+    if len(marks) < 4:
+        return None
+    try:
+        return sort_marks(list(marks))
+    except StopIteration:
+        return None
+
+
+def locate_marks(image: cv2.typing.MatLike, parameters: DetectionParameters) -> Detection:
+    for windows in detection_windows(image.shape, parameters):
+        detection = detect_marks(image, windows, parameters)
+        if consistent_marks(detection.marks) is not None:
+            break
+    return detection
+
+
+def merge_patch(candidates: list[list[(float, float)]], threshold: float):
+    mark = merge_cluster(candidates, threshold)
+    return [] if mark is None else [mark]
+
+
+def downscale(image: cv2.typing.MatLike, width: int) -> (cv2.typing.MatLike, float):
+    small = image
+    while small.shape[1] > width > 0:
+        small = cv2.pyrDown(small)
+    return small, small.shape[1] / image.shape[1]
+
+
+def refine_marks(
+        image: cv2.typing.MatLike,
+        marks: list[((float, float), (float, float))],
+        scale: float,
+        parameters: DetectionParameters,
+) -> Detection:
+    height, width = image.shape[:2]
+    radius = width * parameters.double_size * parameters.refine_margin
+    refined = Detection([], [], [], [], [])
+    for ((x1, x2), (y1, y2)) in marks:
+        center = (avg(x1, x2) / scale, avg(y1, y2) / scale)
+        left, top = max(0, int(center[0] - radius)), max(0, int(center[1] - radius))
+        right, bottom = min(width, int(center[0] + radius)), min(height, int(center[1] + radius))
+        detection = detect_marks(image, [(left, top, right - left, bottom - top)], parameters, merge_patch)
+        if len(detection.marks) == 0:
+            continue
+        mark = min(detection.marks, key=lambda mark: distance_mark(center, mark))
+        refined.contours_single.extend(detection.contours_single)
+        refined.contours_double.extend(detection.contours_double)
+        refined.shapes_single.extend(detection.shapes_single)
+        refined.shapes_double.extend(detection.shapes_double)
+        refined.marks.append(mark)
+    return refined
+
+
+def search_marks(
+        scan: cv2.typing.MatLike,
+        parameters: DetectionParameters = DetectionParameters(),
+        timer: StageTimer | None = None,
+) -> Detection:
+    timer = timer or StageTimer()
+    with timer.stage("prepare"):
+        add_border(scan)
+        small, scale = downscale(scan, parameters.coarse_width)
+    detection = None
+    if small is not scan:
+        with timer.stage("coarse"):
+            coarse = locate_marks(small, parameters)
+        with timer.stage("refine"):
+            detection = refine_marks(scan, coarse.marks, scale, parameters)
+    if detection is None or consistent_marks(detection.marks) is None:
+        with timer.stage("full"):
+            detection = locate_marks(scan, parameters)
+    return detection
+
+
+def cascade_marks(
+        scan: cv2.typing.MatLike,
+        parameters: DetectionParameters = DetectionParameters(),
+        timer: StageTimer | None = None,
+) -> (Detection, list[((float, float), (float, float))]):
+    timer = timer or StageTimer()
+    for strategy in parameters.cascade:
+        with timer.stage(strategy):
+            detection = search_marks(scan, parameters._replace(threshold=strategy), timer)
+            marks = consistent_marks(detection.marks)
+        if marks is not None:
+            logging.info("found marks with %s threshold in %.1f ms", strategy, timer.timings[strategy] * 1000)
+            return detection, marks
+        logging.info("no consistent marks with %s threshold", strategy)
+    raise MarksNotFoundError("found no four consistent registration marks", detection)
+
+
+def mark_centers(
+        shape: numpy.shape,
+        marks: list[((float, float), (float, float))],
+) -> [(float, float), (float, float), (float, float), (float, float)]:
+    return [
+        to_mm(shape, (avg(x1, x2), avg(y1, y2)))
+        for ((x1, x2), (y1, y2)) in marks
+    ]
+
+
+def debug_detection(dbgScan: cv2.typing.MatLike, detection: Detection):
+    contours_single, contours_double, shapes_single, shapes_double, marks = detection
+    dbg = dbgScan.copy()
+    cv2.drawContours(dbg, contours_single, -1, (0, 0, 255), 2)
+    cv2.drawContours(dbg, contours_double, -1, (255, 0, 0), 2)
+    for tri in shapes_single:
+        cv2.drawContours(dbg, [numpy.intp(tri)], -1, (0, 255, 255), 2)
+    for rect in shapes_double:
+        cv2.drawContours(dbg, [numpy.intp(rect)], -1, (0, 255, 255), 2)
+    cv2.imwrite(DEBUGPATH+"/contours_1.jpg", dbg)
+
+    dbg = dbgScan.copy()
+    for ((x1, x2), (y1, y2)) in marks:
+        cv2.rectangle(dbg, numpy.intp((x1, y1)), numpy.intp((x2, y2)), (0, 255, 0), 2)
+    cv2.imwrite(DEBUGPATH+"/contours_2.jpg", dbg)
+
+
+def find_marks(
+        file: str,
+        parameters: DetectionParameters = DetectionParameters(),
+        timer: StageTimer | None = None,
+) -> [(float, float), (float, float), (float, float), (float, float)]:
+    timer = timer or StageTimer()
+    with timer.stage("load"):
+        scan = load_scan(file)
+    if DEBUGPATH:
+        dbgScan = cv2.cvtColor(scan, cv2.COLOR_GRAY2RGB)
+
+    try:
+        detection, marks = cascade_marks(scan, parameters, timer)
+    except MarksNotFoundError as e:
+        if DEBUGPATH and e.detection is not None:
+            debug_detection(dbgScan, e.detection)
+        raise
+
+    if DEBUGPATH:
+        debug_detection(dbgScan, detection)
         dbg = dbgScan.copy()
         for ((x1, x2), (y1, y2)) in marks:
             cv2.rectangle(dbg, numpy.intp((x1, y1)), numpy.intp((x2, y2)), (0, 255, 0), 2)
         cv2.imwrite(DEBUGPATH + "/contours_3.jpg", dbg)
 
-    return [
-        to_mm(scan.shape, (avg(x1, x2), avg(y1, y2)))
-        for ((x1, x2), (y1, y2)) in marks
-    ]
+    return mark_centers(scan.shape, marks)
 
 
 def apply_matrix(
@@ -246,7 +488,7 @@ def apply_matrix(
         matrix: (float, float, float, float, float, float)
 ) -> (float, float):
     x, y = value
-    a, c, e, b, d, f = matrix
+    a, b, e, c, d, f = matrix
     return a * x + c * y + e, b * x + d * y + f
 
 
@@ -260,33 +502,114 @@ def calculate_transform(
             matrix[0][1], matrix[1][1], matrix[1][2]+0.5)
 
 
+def svg_matrix(matrix: (float, float, float, float, float, float)) -> (float, float, float, float, float, float):
+    return tuple(round(float(matrix[i]), MATRIX_DECIMALS) for i in (0, 1, 3, 4, 2, 5))
+
+
 def format_transform_matrix(matrix: (float, float, float, float, float, float)) -> str:
-    return "matrix({0:.3f} {1:.3f} {3:.3f} {4:.3f} {2:.3f} {5:.3f})".format(
-        matrix[0], matrix[1], matrix[2], matrix[3], matrix[4], matrix[5]
-    )
+    return "matrix({0})".format(" ".join("{0:.{1}f}".format(value, MATRIX_DECIMALS) for value in svg_matrix(matrix)))
 
 
 def generate_cut(source: str, target: str, transform: (float, float, float, float, float, float)):
-    dom = parse(source)
-    document = dom.firstChild
-    wrapper = dom.createElement("g")
-    wrapper.setAttribute("transform", format_transform_matrix(transform))
-    transformable = [node for node in document.childNodes if node.nodeName == "g"]
-    for node in transformable:
-        document.removeChild(node)
-        wrapper.appendChild(node)
-    document.appendChild(wrapper)
-    with open(target, "w") as writer:
-        dom.writexml(writer, indent="  ", addindent="  ", newl="\n")
-
-
-def process_cut(source: str, scan: str, out: str):
-    marks = find_marks(scan)
+    write_cut(prepare_cut(source), target, format_transform_matrix(transform))
+
+
+def align_scan(
+        scan: str,
+        parameters: DetectionParameters = DetectionParameters(),
+        cache: MarkCache | None = None,
+) -> (float, float, float, float, float, float):
+    if cache is not None:
+        key = cache.key(scan, parameters)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry.transform
+    marks = find_marks(scan, parameters)
     transform = calculate_transform(marks)
+    if cache is not None:
+        cache.put(key, CacheEntry(marks, transform))
+    return transform
+
+
+def process_cut(source: str, scan: str, out: str, cache: MarkCache | None = None):
+    transform = align_scan(scan, cache=cache)
     generate_cut(source, out, transform)
+    logging.info("peak RSS: %.1f MiB", peak_rss() / 2 ** 20)
+
+
+def list_scans(paths: list[str]) -> list[str]:
+    scans = []
+    for path in paths:
+        if os.path.isdir(path):
+            scans += sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if not name.startswith(".") and os.path.isfile(os.path.join(path, name))
+            )
+        else:
+            scans.append(path)
+    return scans
+
+
+def batch_target(out: str, scan: str) -> str:
+    return os.path.join(out, os.path.splitext(os.path.basename(scan))[0] + ".svg")
+
+
+def process_batch(
+        source: str,
+        scans: list[str],
+        out: str,
+        parameters: DetectionParameters = DetectionParameters(),
+        workers: int | None = None,
+        cache: MarkCache | None = None,
+) -> dict[str, Exception]:
+    template = prepare_cut(source)
+    os.makedirs(out, exist_ok=True)
+    scans = list(dict.fromkeys(scans))
+    targets = {scan: batch_target(out, scan) for scan in scans}
+    sharing = {}
+    for (scan, target) in targets.items():
+        sharing.setdefault(target, []).append(scan)
+    failures = {}
+    for (target, shared) in sharing.items():
+        if len(shared) > 1:
+            for scan in shared:
+                failures[scan] = Exception("{0} would be written by {1}".format(target, ", ".join(shared)))
+                logging.error("%s: %s", scan, repr(failures[scan]))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {
+            executor.submit(align_scan, scan, parameters, cache): scan
+            for scan in scans if scan not in failures
+        }
+        for future in as_completed(futures):
+            scan = futures[future]
+            target = targets[scan]
+            try:
+                write_cut(template, target, format_transform_matrix(future.result()))
+                logging.info("%s: %s", scan, target)
+            except Exception as e:
+                failures[scan] = e
+                logging.error("%s: %s", scan, repr(e))
+    logging.info("aligned %d of %d scans", len(scans) - len(failures), len(scans))
+    return failures
 
 
 if __name__ == "__main__":
-    args = sys.argv[1:]
-    if len(args) == 3:
-        process_cut(args[0], args[1], args[2])
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source")
+    parser.add_argument("paths", nargs="+", metavar="scan")
+    parser.add_argument("--batch", metavar="OUT_DIR")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--matrix", action="store_true")
+    args = parser.parse_args()
+    cache = None if args.no_cache else MarkCache(default_cache_path())
+    if args.batch is not None:
+        if process_batch(args.source, list_scans(args.paths), args.batch, workers=args.workers, cache=cache):
+            sys.exit(1)
+    elif args.matrix and len(args.paths) == 1:
+        print(json.dumps(svg_matrix(align_scan(args.paths[0], cache=cache))))
+    elif len(args.paths) == 2:
+        process_cut(args.source, args.paths[0], args.paths[1], cache)
+    else:
+        parser.error("expected SOURCE SCAN OUT, --matrix SOURCE SCAN, or --batch OUT_DIR SOURCE SCAN...")
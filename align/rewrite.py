@@ -0,0 +1,148 @@
+import re
+import shutil
+from typing import BinaryIO, NamedTuple
+
+TAG_OPEN = re.compile(rb"<")
+TAG_CLOSE = re.compile(rb">")
+TAG_CONTENT = re.compile(rb"[>\"']")
+DOUBLE_QUOTE = re.compile(rb"\"")
+SINGLE_QUOTE = re.compile(rb"'")
+COMMENT_CLOSE = re.compile(rb"-->")
+CDATA_CLOSE = re.compile(rb"]]>")
+INSTRUCTION_CLOSE = re.compile(rb"\?>")
+DECLARATION_CONTENT = re.compile(rb"[>\[]")
+SUBSET_CLOSE = re.compile(rb"]")
+NAME = re.compile(rb"[^\s/>]*")
+
+
+class ByteScanner:
+    def __init__(self, reader: BinaryIO, chunk_size: int = 2 ** 20):
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.buffer = b""
+        self.offset = 0
+        self.position = 0
+
+    def read(self) -> bool:
+        chunk = self.reader.read(self.chunk_size)
+        if not chunk:
+            return False
+        drop = max(0, self.position - self.offset - 1)
+        self.buffer = self.buffer[drop:] + chunk
+        self.offset += drop
+        return True
+
+    def find(self, pattern: re.Pattern) -> tuple[int, bytes] | None:
+        while True:
+            match = pattern.search(self.buffer, self.position - self.offset)
+            if match is not None:
+                self.position = self.offset + match.end()
+                return self.offset + match.start(), match.group()
+            self.position = max(self.position, self.offset + len(self.buffer) - 8)
+            if not self.read():
+                return None
+
+    def peek(self, length: int) -> bytes:
+        while self.offset + len(self.buffer) < self.position + length and self.read():
+            pass
+        start = self.position - self.offset
+        return self.buffer[start:start + length]
+
+    def byte_before(self, position: int) -> bytes:
+        index = position - self.offset - 1
+        return self.buffer[index:index + 1]
+
+
+def skip_tag(scanner: ByteScanner) -> bool:
+    while True:
+        found = scanner.find(TAG_CONTENT)
+        if found is None:
+            raise Exception("unterminated tag")
+        position, token = found
+        if token == b'"':
+            scanner.find(DOUBLE_QUOTE)
+        elif token == b"'":
+            scanner.find(SINGLE_QUOTE)
+        else:
+            return scanner.byte_before(position) == b"/"
+
+
+def skip_declaration(scanner: ByteScanner):
+    found = scanner.find(DECLARATION_CONTENT)
+    if found is not None and found[1] == b"[":
+        scanner.find(SUBSET_CLOSE)
+        scanner.find(TAG_CLOSE)
+
+
+class CutTemplate(NamedTuple):
+    source: str
+    groups: list[tuple[int, int]]
+    end: int
+
+
+def prepare_cut(source: str) -> CutTemplate:
+    groups = []
+    depth = 0
+    group_start = None
+    end = None
+    with open(source, "rb") as reader:
+        scanner = ByteScanner(reader)
+        while (found := scanner.find(TAG_OPEN)) is not None:
+            start, _ = found
+            head = scanner.peek(8)
+            if head.startswith(b"!--"):
+                scanner.find(COMMENT_CLOSE)
+            elif head.startswith(b"![CDATA["):
+                scanner.find(CDATA_CLOSE)
+            elif head.startswith(b"?"):
+                scanner.find(INSTRUCTION_CLOSE)
+            elif head.startswith(b"!"):
+                skip_declaration(scanner)
+            elif head.startswith(b"/"):
+                scanner.find(TAG_CLOSE)
+                if depth == 2 and group_start is not None:
+                    groups.append((group_start, scanner.position))
+                    group_start = None
+                elif depth == 1:
+                    end = start
+                depth -= 1
+            else:
+                name = NAME.match(scanner.peek(256)).group()
+                self_closing = skip_tag(scanner)
+                depth += 1
+                if depth == 2 and name == b"g":
+                    group_start = start
+                if self_closing:
+                    if depth == 2 and group_start is not None:
+                        groups.append((group_start, scanner.position))
+                        group_start = None
+                    depth -= 1
+    if end is None:
+        raise Exception("no root element in " + source)
+    return CutTemplate(source, groups, end)
+
+
+def copy_range(reader: BinaryIO, writer: BinaryIO, start: int, end: int):
+    reader.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = reader.read(min(remaining, 2 ** 20))
+        if not chunk:
+            break
+        writer.write(chunk)
+        remaining -= len(chunk)
+
+
+def write_cut(template: CutTemplate, target: str, transform: str):
+    with open(template.source, "rb") as reader, open(target, "wb") as writer:
+        position = 0
+        for (start, end) in template.groups:
+            copy_range(reader, writer, position, start)
+            position = end
+        copy_range(reader, writer, position, template.end)
+        writer.write('<g transform="{0}">'.format(transform).encode())
+        for (start, end) in template.groups:
+            copy_range(reader, writer, start, end)
+        writer.write(b"</g>")
+        reader.seek(template.end)
+        shutil.copyfileobj(reader, writer)
@@ -0,0 +1,32 @@
+import cv2
+import numpy
+
+from benchmark import Case, Distortion, render_scan
+from main import DetectionParameters, process_batch
+
+DESIGN = """<svg xmlns="http://www.w3.org/2000/svg" width="210mm" height="297mm" viewBox="0 0 210 297">
+<g id="cut"><path d="M 10 10 L 50 10 L 50 50 Z"/></g>
+</svg>
+"""
+
+
+def write_scan(path: str):
+    image, _ = render_scan(Case(300, "double", Distortion()), DetectionParameters(), numpy.random.default_rng(1))
+    cv2.imwrite(path, image)
+
+
+def test_scans_sharing_an_output_name_fail_before_alignment(tmp_path):
+    source = tmp_path / "design.svg"
+    source.write_text(DESIGN)
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+    scans = [str(tmp_path / "a" / "x.png"), str(tmp_path / "b" / "x.png"), str(tmp_path / "x.jpg"), str(tmp_path / "y.png")]
+    for scan in scans:
+        write_scan(scan)
+    out = tmp_path / "out"
+
+    failures = process_batch(str(source), scans + [scans[-1]], str(out), workers=1)
+
+    assert sorted(failures) == sorted(scans[:3])
+    assert all("x.svg" in str(error) for error in failures.values())
+    assert sorted(path.name for path in out.iterdir()) == ["y.svg"]
@@ -0,0 +1,14 @@
+import numpy
+
+from benchmark import Case, Distortion, render_scan
+from main import DetectionParameters
+
+
+def ink(dpi: int, mark: str) -> float:
+    image, _ = render_scan(Case(dpi, mark, Distortion()), DetectionParameters(), numpy.random.default_rng(0))
+    return float((255 - image.astype(numpy.float64)).sum() / 255)
+
+
+def test_marks_keep_their_physical_size_across_dpi():
+    for mark in ("double", "single"):
+        assert 3.5 < ink(600, mark) / ink(300, mark) <= 4
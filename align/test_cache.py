@@ -0,0 +1,52 @@
+import os
+
+import cv2
+import numpy
+
+import main
+from benchmark import Case, Distortion, render_scan
+from cache import CacheEntry, MarkCache
+from main import DetectionParameters, align_scan
+
+ENTRY = CacheEntry([(0.1, 0.1), (0.9, 0.1), (0.1, 0.9), (0.9, 0.9)], (1.0, 0.0, 0.0, 0.0, 1.0, 0.0))
+
+
+def test_cache_hit_skips_detection(tmp_path, monkeypatch):
+    scan = str(tmp_path / "scan.png")
+    image, _ = render_scan(Case(300, "double", Distortion()), DetectionParameters(), numpy.random.default_rng(2))
+    cv2.imwrite(scan, image)
+    calls = []
+    find_marks = main.find_marks
+
+    def recording(*arguments):
+        calls.append(arguments)
+        return find_marks(*arguments)
+
+    monkeypatch.setattr(main, "find_marks", recording)
+    cache = MarkCache(str(tmp_path / "cache"))
+
+    first = align_scan(scan, cache=cache)
+    second = align_scan(scan, cache=cache)
+
+    assert len(calls) == 1
+    assert second == tuple(float(value) for value in first)
+    assert align_scan(scan, DetectionParameters(tolerance=0.6), cache) is not None
+    assert len(calls) == 2
+
+
+def test_eviction_keeps_the_recently_used_entries_within_the_size_bound(tmp_path):
+    directory = str(tmp_path)
+    probe = MarkCache(directory)
+    probe.put("probe", ENTRY)
+    size = os.path.getsize(probe.path("probe"))
+    os.remove(probe.path("probe"))
+    cache = MarkCache(directory, max_size=3 * size)
+
+    for (age, key) in enumerate("abc"):
+        cache.put(key, ENTRY)
+        os.utime(cache.path(key), (1000 + age, 1000 + age))
+    assert cache.get("a") == ENTRY
+    cache.put("d", ENTRY)
+
+    assert sorted(os.listdir(directory)) == ["a.json", "c.json", "d.json"]
+    assert cache.get("b") is None
@@ -0,0 +1,35 @@
+import numpy
+import pytest
+
+import main
+from benchmark import Case, Distortion, render_scan
+from main import Detection, DetectionParameters, StageTimer, ThresholdStrategy, consistent_marks, search_marks
+
+
+def scan(dpi: int = 300, mark: str = "double") -> numpy.ndarray:
+    image, _ = render_scan(Case(dpi, mark, Distortion(rotation=0.5)), DetectionParameters(), numpy.random.default_rng(3))
+    return image
+
+
+@pytest.mark.parametrize("dpi", [300, 600])
+@pytest.mark.parametrize("mark", ["double", "single"])
+@pytest.mark.parametrize("threshold", list(ThresholdStrategy))
+def test_coarse_level_finds_marks_at_any_resolution(dpi, mark, threshold):
+    timer = StageTimer()
+
+    detection = search_marks(scan(dpi, mark), DetectionParameters(threshold=threshold), timer)
+
+    assert "coarse" in timer.timings
+    assert "full" not in timer.timings
+    assert consistent_marks(detection.marks) is not None
+
+
+def test_inconsistent_coarse_marks_fall_back_to_full_page(monkeypatch):
+    corner = ((10.0, 20.0), (10.0, 20.0))
+    monkeypatch.setattr(main, "refine_marks", lambda *arguments: Detection([], [], [], [], [corner] * 4))
+    timer = StageTimer()
+
+    detection = search_marks(scan(), DetectionParameters(), timer)
+
+    assert "full" in timer.timings
+    assert consistent_marks(detection.marks) is not None
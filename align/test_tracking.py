@@ -0,0 +1,30 @@
+import numpy
+
+import tracking
+from benchmark import Case, Distortion, render_scan, transform_error
+from main import DetectionParameters
+from tracking import MarkTracker
+
+
+def frame(seed: int) -> tuple[numpy.ndarray, tuple]:
+    return render_scan(Case(300, "double", Distortion(rotation=0.3)), DetectionParameters(), numpy.random.default_rng(seed))
+
+
+def test_tracking_falls_back_to_full_detection_when_marks_are_lost(monkeypatch):
+    full = []
+    cascade_marks = tracking.cascade_marks
+
+    def recording(*arguments):
+        full.append(arguments)
+        return cascade_marks(*arguments)
+
+    monkeypatch.setattr(tracking, "cascade_marks", recording)
+    tracker = MarkTracker()
+    (near, near_truth), (far, far_truth) = frame(3), frame(4)
+
+    results = [tracker.update(near.copy()), tracker.update(near.copy()), tracker.update(far.copy())]
+
+    assert [result.tracked for result in results] == [False, True, False]
+    assert len(full) == 2
+    assert transform_error(results[1].transform, near_truth) < 0.2
+    assert transform_error(results[2].transform, far_truth) < 0.2
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterator, NamedTuple
+
+import cv2
+
+from main import DetectionParameters, add_border, calculate_transform, cascade_marks, mark_centers, refine_marks
+
+
+class TrackedFrame(NamedTuple):
+    marks: list[tuple[float, float]]
+    transform: tuple[float, float, float, float, float, float]
+    tracked: bool
+
+
+class MarkTracker:
+    def __init__(self, parameters: DetectionParameters = DetectionParameters()):
+        self.parameters = parameters
+        self.previous: list[((float, float), (float, float))] | None = None
+
+    def update(self, frame: cv2.typing.MatLike) -> TrackedFrame:
+        add_border(frame)
+        marks = None
+        if self.previous is not None:
+            detection = refine_marks(frame, self.previous, 1.0, self.parameters)
+            if len(detection.marks) == 4:
+                marks = detection.marks
+        tracked = marks is not None
+        if not tracked:
+            self.previous = None
+            _, marks = cascade_marks(frame, self.parameters)
+        self.previous = marks
+        centers = mark_centers(frame.shape, marks)
+        return TrackedFrame(centers, calculate_transform(centers), tracked)
+
+
+def watch_folder(path: str, interval: float = 0.5) -> Iterator[tuple[str, cv2.typing.MatLike]]:
+    seen = set()
+    while True:
+        now = time.time()
+        ready = sorted(
+            entry.name for entry in os.scandir(path)
+            if entry.is_file() and not entry.name.startswith(".") and entry.name not in seen
+            and now - entry.stat().st_mtime >= interval
+        )
+        for name in ready:
+            seen.add(name)
+            frame = cv2.imread(os.path.join(path, name), cv2.IMREAD_GRAYSCALE)
+            if frame is not None:
+                yield name, frame
+        if len(ready) == 0:
+            time.sleep(interval)
+
+
+def capture_frames(source: str) -> Iterator[tuple[str, cv2.typing.MatLike]]:
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    index = 0
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield str(index), cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            index += 1
+    finally:
+        capture.release()
+
+
+def track_stream(
+        frames: Iterator[tuple[str, cv2.typing.MatLike]],
+        tracker: MarkTracker,
+) -> Iterator[dict]:
+    for name, frame in frames:
+        start = time.perf_counter()
+        try:
+            result = tracker.update(frame)
+            output = {
+                "frame": name,
+                "transform": [float(value) for value in result.transform],
+                "tracked": result.tracked,
+            }
+        except Exception as e:
+            tracker.previous = None
+            output = {"frame": name, "error": repr(e)}
+        output["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        yield output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--folder")
+    source.add_argument("--camera")
+    parser.add_argument("--interval", type=float, default=0.5)
+    args = parser.parse_args()
+    if args.folder is not None:
+        frames = watch_folder(args.folder, args.interval)
+    else:
+        frames = capture_frames(args.camera)
+    for output in track_stream(frames, MarkTracker()):
+        sys.stdout.write(json.dumps(output) + "\n")
+        sys.stdout.flush()
@@ -0,0 +1 @@
+collect_ignore = ["align", "preprocess", "svg_to_json"]
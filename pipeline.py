@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import NamedTuple, Sequence
+from xml.etree.ElementTree import iterparse
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "svg_to_json"))
+sys.path.insert(0, os.path.join(ROOT, "preprocess"))
+sys.path.append(os.path.join(ROOT, "align"))
+
+from cache import JsonStore, default_cache_path
+from fcm import FileDto
+from flatten import OUTPUT_HEIGHT, OUTPUT_WIDTH, Matrix, document_matrix, flatten_paths, invert, multiply, \
+    transform_paths
+from inkscape import InkscapePool
+from json_writer import dump
+from main import convert_paths, extract_paths
+from svg import PathData, Scope, iter_paths
+
+LAYERS = ("cut", "cut_kiss", "cut_die")
+CACHE_VERSION = 1
+
+
+class Tools(NamedTuple):
+    align: list[str] = ["pipenv", "run", "python", "main.py"]
+    preprocess: str = os.path.join(ROOT, "preprocess", "preprocess.sh")
+    export: str = os.path.join(ROOT, "preprocess", "export.sh")
+    flatten: str = os.path.join(ROOT, "preprocess", "flatten.sh")
+    converter: str = os.path.join(ROOT, "json_to_fcm", "target", "release", "fcm-converter")
+
+
+class LayerResult(NamedTuple):
+    layer: str
+    output: str
+    error: str | None
+    seconds: float
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class PreparedLayer(NamedTuple):
+    layer: str
+    paths: list[PathData] | None
+    error: str | None
+
+
+class PreparedDesign(NamedTuple):
+    source: str
+    matrix: Matrix
+    layers: list[PreparedLayer]
+
+
+def run(command: list[str], cwd: str) -> str:
+    completed = subprocess.run(command, cwd=cwd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if completed.returncode != 0:
+        message = (completed.stderr or completed.stdout).strip().splitlines()
+        raise Exception("{0} exited with {1}{2}".format(
+            os.path.basename(command[0]), completed.returncode, ": " + message[-1] if message else ""
+        ))
+    return completed.stdout
+
+
+def error_of(e: Exception) -> str:
+    return str(e) or repr(e)
+
+
+class DesignCache(JsonStore):
+    def __init__(self, directory: str, max_size: int = 256 * 2 ** 20):
+        super().__init__(directory, max_size)
+
+    def key(self, source: str, layer: str, native: bool) -> str:
+        return super().key(source, CACHE_VERSION, layer, native)
+
+    def get(self, key: str, layer: str) -> PreparedLayer | None:
+        data = self.load(key)
+        if data is None:
+            return None
+        return PreparedLayer(layer, [
+            PathData(path_data, tuple(Scope(*scope) for scope in scopes)) for (path_data, scopes) in data["paths"]
+        ], None)
+
+    def put(self, key: str, prepared: PreparedLayer):
+        if prepared.paths is not None:
+            self.store(key, {"paths": [[path.data, [list(scope) for scope in path.scopes]] for path in prepared.paths]})
+
+
+def layer_output(source: str, layer: str) -> str:
+    name = os.path.basename(source)
+    if name.endswith(".svg"):
+        name = name[:-len(".svg")]
+    return os.path.join(os.path.dirname(source), "{0}_{1}.fcm".format(name, layer))
+
+
+def preprocess_layer(
+        layer: str,
+        source: str,
+        directory: str,
+        tools: Tools,
+        exported: str | None = None,
+        native: bool = False,
+) -> str:
+    svg = os.path.join(directory, "preprocess-output.svg")
+    if exported is None and native:
+        exported = os.path.join(directory, "preprocess-1-convert-to-path.svg")
+        run([tools.export, source, exported, layer], directory)
+    if exported is None:
+        run([tools.preprocess, source, svg, layer], directory)
+    elif not native:
+        run([tools.flatten, exported, svg], directory)
+    return exported if native else svg
+
+
+def emit_layer(converted: FileDto, directory: str, target: str, tools: Tools):
+    output = os.path.join(directory, "preprocess-output.json")
+    with open(output, "w") as out:
+        dump(converted, out)
+    run([tools.converter, output, target], directory)
+
+
+def process_layer(
+        layer: str,
+        source: str,
+        directory: str,
+        target: str,
+        tools: Tools,
+        exported: str | None = None,
+        native: bool = False,
+):
+    svg = preprocess_layer(layer, source, directory, tools, exported, native)
+    emit_layer(extract_paths(svg, flatten=native), directory, target, tools)
+
+
+def read_layer(
+        layer: str,
+        source: str,
+        directory: str,
+        tools: Tools,
+        exported: str | None = None,
+        native: bool = False,
+) -> list[PathData]:
+    svg = preprocess_layer(layer, source, directory, tools, exported, native)
+    return list(flatten_paths(svg) if native else iter_paths(svg))
+
+
+def place_layer(paths: list[PathData], matrix: Matrix, directory: str, target: str, tools: Tools):
+    emit_layer(convert_paths(transform_paths(paths, matrix)), directory, target, tools)
+
+
+def run_layer(
+        executor: ProcessPoolExecutor,
+        pool: InkscapePool | None,
+        native: bool,
+        function,
+        layer: str,
+        source: str,
+        directory: str,
+        *arguments,
+):
+    exported = None
+    if pool is not None:
+        copy = os.path.join(directory, "preprocess-0-input.svg")
+        exported = os.path.join(directory, "preprocess-1-convert-to-path.svg")
+        shutil.copy(source, copy)
+        pool.export(copy, exported, layer)
+    return executor.submit(function, layer, source, directory, *arguments, exported, native).result()
+
+
+def timed_layer(layer: str, target: str, function, *arguments) -> LayerResult:
+    start = time.perf_counter()
+    try:
+        function(*arguments)
+    except Exception as e:
+        return LayerResult(layer, target, error_of(e), time.perf_counter() - start)
+    return LayerResult(layer, target, None, time.perf_counter() - start)
+
+
+def prepare_layer(
+        executor: ProcessPoolExecutor,
+        pool: InkscapePool | None,
+        native: bool,
+        layer: str,
+        source: str,
+        directory: str,
+        tools: Tools,
+) -> PreparedLayer:
+    try:
+        return PreparedLayer(layer, run_layer(executor, pool, native, read_layer, layer, source, directory, tools), None)
+    except Exception as e:
+        return PreparedLayer(layer, None, error_of(e))
+
+
+def keep_debug(workdir: str, layers: Sequence[str], debug: str):
+    for layer in layers:
+        directory = os.path.join(workdir, layer)
+        target = os.path.join(debug, "preprocess-" + layer.replace("_", "-"))
+        os.makedirs(target, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith("preprocess-"):
+                shutil.move(os.path.join(directory, name), target)
+    if os.path.exists(os.path.join(workdir, "align.svg")):
+        shutil.move(os.path.join(workdir, "align.svg"), debug)
+
+
+def layer_directories(workdir: str, layers: Sequence[str]) -> list[str]:
+    directories = [os.path.join(workdir, layer) for layer in layers]
+    for directory in directories:
+        os.mkdir(directory)
+    return directories
+
+
+def shared_executor(executor: ProcessPoolExecutor | None, workers: int):
+    return nullcontext(executor) if executor is not None else ProcessPoolExecutor(max_workers=workers)
+
+
+def existing(*paths: str) -> list[str]:
+    paths = [os.path.realpath(path) for path in paths]
+    for path in paths:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+    return paths
+
+
+def process_design(
+        source: str,
+        scan: str,
+        layers: Sequence[str] = LAYERS,
+        tools: Tools = Tools(),
+        debug: str | None = None,
+        pool: InkscapePool | None = None,
+        native: bool = False,
+) -> list[LayerResult]:
+    source, scan = existing(source, scan)
+    workdir = tempfile.mkdtemp(prefix="svgalign-")
+    try:
+        aligned = os.path.join(workdir, "align.svg")
+        run(tools.align + [source, scan, aligned], os.path.join(ROOT, "align"))
+        targets = [layer_output(source, layer) for layer in layers]
+        directories = layer_directories(workdir, layers)
+        with ProcessPoolExecutor(max_workers=len(layers)) as executor, \
+                ThreadPoolExecutor(max_workers=len(layers)) as threads:
+            futures = [
+                threads.submit(
+                    timed_layer, layer, target,
+                    run_layer, executor, pool, native, process_layer, layer, aligned, directory, target, tools,
+                )
+                for (layer, directory, target) in zip(layers, directories, targets)
+            ]
+            results = [future.result() for future in futures]
+        if debug is not None:
+            keep_debug(workdir, layers, debug)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def design_matrix(source: str) -> Matrix:
+    _, root = next(iterparse(source, events=("start",)))
+    return document_matrix(root, OUTPUT_WIDTH, OUTPUT_HEIGHT)
+
+
+def prepare_design(
+        source: str,
+        layers: Sequence[str] = LAYERS,
+        tools: Tools = Tools(),
+        pool: InkscapePool | None = None,
+        native: bool = False,
+        cache: DesignCache | None = None,
+        executor: ProcessPoolExecutor | None = None,
+) -> PreparedDesign:
+    source, = existing(source)
+    keys = {layer: cache.key(source, layer, native) for layer in layers} if cache is not None else {}
+    prepared = {layer: cache.get(key, layer) for (layer, key) in keys.items()}
+    missing = [layer for layer in layers if prepared.get(layer) is None]
+    if len(missing) > 0:
+        workdir = tempfile.mkdtemp(prefix="svgalign-")
+        try:
+            directories = layer_directories(workdir, missing)
+            with shared_executor(executor, len(missing)) as processes, \
+                    ThreadPoolExecutor(max_workers=len(missing)) as threads:
+                futures = [
+                    threads.submit(prepare_layer, processes, pool, native, layer, source, directory, tools)
+                    for (layer, directory) in zip(missing, directories)
+                ]
+                for future in futures:
+                    layer = future.result()
+                    prepared[layer.layer] = layer
+                    if cache is not None:
+                        cache.put(keys[layer.layer], layer)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return PreparedDesign(source, design_matrix(source), [prepared[layer] for layer in layers])
+
+
+def scan_matrix(source: str, scan: str, tools: Tools) -> Matrix:
+    output = run(tools.align + ["--matrix", source, scan], os.path.join(ROOT, "align"))
+    return tuple(json.loads(output.strip().splitlines()[-1]))
+
+
+def place_design(
+        design: PreparedDesign,
+        transform: Matrix,
+        targets: Sequence[str],
+        tools: Tools = Tools(),
+        debug: str | None = None,
+        executor: ProcessPoolExecutor | None = None,
+) -> list[LayerResult]:
+    matrix = multiply(multiply(design.matrix, transform), invert(design.matrix))
+    layers = [prepared.layer for prepared in design.layers]
+    workdir = tempfile.mkdtemp(prefix="svgalign-")
+    try:
+        directories = layer_directories(workdir, layers)
+        with shared_executor(executor, len(layers)) as processes:
+            futures = [
+                processes.submit(timed_layer, prepared.layer, target, place_layer, prepared.paths, matrix, directory, target, tools)
+                if prepared.paths is not None else None
+                for (prepared, directory, target) in zip(design.layers, directories, targets)
+            ]
+            results = [
+                future.result() if future is not None else LayerResult(prepared.layer, target, prepared.error, 0.0)
+                for (prepared, target, future) in zip(design.layers, targets, futures)
+            ]
+        if debug is not None:
+            keep_debug(workdir, layers, debug)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def apply_scan(
+        design: PreparedDesign,
+        scan: str,
+        tools: Tools = Tools(),
+        debug: str | None = None,
+) -> list[LayerResult]:
+    scan, = existing(scan)
+    transform = scan_matrix(design.source, scan, tools)
+    targets = [layer_output(design.source, prepared.layer) for prepared in design.layers]
+    return place_design(design, transform, targets, tools, debug)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source")
+    parser.add_argument("scan")
+    parser.add_argument("--layers", nargs="+", choices=LAYERS, default=list(LAYERS))
+    parser.add_argument("--align-command", default=shlex.join(Tools().align))
+    parser.add_argument("--preprocess", default=Tools().preprocess)
+    parser.add_argument("--export", default=Tools().export)
+    parser.add_argument("--flatten", default=Tools().flatten)
+    parser.add_argument("--converter", default=Tools().converter)
+    parser.add_argument("--inkscape-workers", type=int, default=0, metavar="N")
+    parser.add_argument("--inkscape", default="inkscape")
+    parser.add_argument("--native-flatten", action="store_true")
+    parser.add_argument("--cached-design", action="store_true")
+    parser.add_argument("--cache-dir", default=default_cache_path("designs"))
+    args = parser.parse_args()
+    tools = Tools(
+        shlex.split(args.align_command),
+        os.path.realpath(args.preprocess),
+        os.path.realpath(args.export),
+        os.path.realpath(args.flatten),
+        os.path.realpath(args.converter),
+    )
+    pool = InkscapePool(args.inkscape_workers, shlex.split(args.inkscape)) if args.inkscape_workers > 0 else None
+    debug = os.environ.get("FCM_DEBUG_PATH") or None
+    start = time.perf_counter()
+    try:
+        if args.cached_design:
+            design = prepare_design(
+                args.source, args.layers, tools, pool, args.native_flatten, DesignCache(args.cache_dir),
+            )
+            logging.info("prepared design in %.1fs", time.perf_counter() - start)
+            results = apply_scan(design, args.scan, tools, debug)
+        else:
+            results = process_design(args.source, args.scan, args.layers, tools, debug, pool, args.native_flatten)
+    except Exception as e:
+        logging.error("%s", repr(e))
+        sys.exit(2)
+    finally:
+        if pool is not None:
+            pool.close()
+    for result in results:
+        if result.ok:
+            logging.info("%s: %s (%.1fs)", result.layer, result.output, result.seconds)
+        else:
+            logging.error("%s: failed: %s (%.1fs)", result.layer, result.error, result.seconds)
+    logging.info("%d of %d layers in %.1fs", sum(result.ok for result in results), len(results), time.perf_counter() - start)
+    if not any(result.ok for result in results):
+        sys.exit(1)
@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+INPUT="$1"
+OUTPUT="$2"
+LAYER="$3"
+
+# ensure files and folders exist
+stat "$INPUT" >/dev/null
+mkdir -p "$(dirname "$OUTPUT")" > /dev/null
+
+STEP_0="preprocess-0-input.svg"
+
+cp "$INPUT" "$STEP_0"
+inkscape \
+  --export-id="$LAYER" \
+  --export-id-only \
+  --export-area-page \
+  --export-text-to-path \
+  --export-ignore-filters \
+  "$STEP_0" \
+  -o "$OUTPUT"
+stat "$OUTPUT" > /dev/null
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from typing import NamedTuple, Sequence
+
+PROMPT = b"> "
+EXPORT_ACTIONS = (
+    "export-id:{layer}",
+    "export-id-only",
+    "export-area-page",
+    "export-text-to-path",
+    "export-ignore-filters",
+    "export-filename:{target}",
+    "export-do",
+)
+
+
+class ExportError(Exception):
+    pass
+
+
+class ExportJob(NamedTuple):
+    source: str
+    target: str
+    layer: str
+    future: Future
+
+
+def shell_argument(value: str) -> str:
+    if any(character in value for character in ";\n\r"):
+        raise ExportError("unsupported character in {0!r}".format(value))
+    return value
+
+
+class InkscapeWorker:
+    def __init__(self, command: Sequence[str] = ("inkscape",), timeout: float = 60.0):
+        self.process = subprocess.Popen(
+            list(command) + ["--shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.exports = 0
+        try:
+            self.read_prompt(timeout)
+        except Exception:
+            self.kill()
+            raise
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def read_prompt(self, timeout: float) -> str:
+        output = b""
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while not (output == PROMPT or output.endswith(b"\n" + PROMPT)):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("inkscape did not answer within {0:.0f}s".format(timeout))
+            if len(select.select([fd], [], [], remaining)[0]) == 0:
+                continue
+            chunk = os.read(fd, 4096)
+            if len(chunk) == 0:
+                raise Exception("inkscape exited with {0}".format(self.process.wait()))
+            output += chunk
+        return output[:-len(PROMPT)].decode(errors="replace")
+
+    def command(self, line: str, timeout: float) -> str:
+        self.process.stdin.write(line.encode() + b"\n")
+        return self.read_prompt(timeout)
+
+    def ping(self, timeout: float = 5.0) -> bool:
+        try:
+            self.command("", timeout)
+        except Exception:
+            return False
+        return True
+
+    def export(self, source: str, target: str, layer: str, timeout: float) -> str:
+        if os.path.exists(target):
+            os.remove(target)
+        actions = ["file-open:" + shell_argument(source)]
+        actions += [action.format(layer=shell_argument(layer), target=shell_argument(target)) for action in EXPORT_ACTIONS]
+        actions.append("file-close")
+        output = self.command("; ".join(actions), timeout)
+        self.exports += 1
+        if not os.path.isfile(target) or os.path.getsize(target) == 0:
+            raise ExportError("inkscape did not export {0!r} from {1}".format(layer, source))
+        return output
+
+    def close(self, timeout: float = 5.0):
+        if self.alive():
+            try:
+                self.process.stdin.write(b"quit\n")
+                self.process.wait(timeout)
+            except Exception:
+                self.kill()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class InkscapePool:
+    def __init__(
+            self,
+            size: int = 2,
+            command: Sequence[str] = ("inkscape",),
+            timeout: float = 120.0,
+            startup_timeout: float = 60.0,
+            health_interval: float = 30.0,
+            retries: int = 1,
+    ):
+        self.command = list(command)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        self.retries = retries
+        self.jobs: queue.Queue[ExportJob | None] = queue.Queue()
+        self.lock = threading.Lock()
+        self.starts = 0
+        self.restarts = 0
+        self.exports = 0
+        self.failures = 0
+        self.threads = [threading.Thread(target=self.serve, daemon=True) for _ in range(size)]
+        for thread in self.threads:
+            thread.start()
+
+    def start_worker(self, restart: bool = False) -> InkscapeWorker:
+        worker = InkscapeWorker(self.command, self.startup_timeout)
+        with self.lock:
+            self.starts += 1
+            self.restarts += restart
+        return worker
+
+    def warm_worker(self) -> InkscapeWorker | None:
+        try:
+            return self.start_worker()
+        except Exception as e:
+            logging.error("inkscape worker failed to start: %s", e)
+            return None
+
+    def run(self, worker: InkscapeWorker | None, job: ExportJob) -> InkscapeWorker | None:
+        for attempt in range(self.retries + 1):
+            try:
+                if worker is None or not worker.alive():
+                    worker = self.start_worker(restart=worker is not None or attempt > 0)
+                start = time.perf_counter()
+                worker.export(job.source, job.target, job.layer, self.timeout)
+                with self.lock:
+                    self.exports += 1
+                job.future.set_result(time.perf_counter() - start)
+                return worker
+            except ExportError as e:
+                with self.lock:
+                    self.failures += 1
+                job.future.set_exception(e)
+                return worker
+            except Exception as e:
+                logging.warning("inkscape worker failed on %r: %s", job.layer, e)
+                if worker is not None:
+                    worker.kill()
+                if attempt == self.retries:
+                    with self.lock:
+                        self.failures += 1
+                    job.future.set_exception(e)
+        return worker
+
+    def serve(self):
+        worker = self.warm_worker()
+        while True:
+            try:
+                job = self.jobs.get(timeout=self.health_interval)
+            except queue.Empty:
+                if worker is not None and not (worker.alive() and worker.ping()):
+                    logging.warning("restarting unresponsive inkscape worker")
+                    worker.kill()
+                    try:
+                        worker = self.start_worker(restart=True)
+                    except Exception as e:
+                        logging.error("inkscape worker failed to start: %s", e)
+                        worker = None
+                continue
+            if job is None:
+                break
+            if job.future.set_running_or_notify_cancel():
+                worker = self.run(worker, job)
+        if worker is not None:
+            worker.close()
+
+    def submit(self, source: str, target: str, layer: str) -> Future:
+        future = Future()
+        self.jobs.put(ExportJob(os.path.realpath(source), os.path.realpath(target), layer, future))
+        return future
+
+    def export(self, source: str, target: str, layer: str) -> float:
+        return self.submit(source, target, layer).result()
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input")
+    parser.add_argument("output_dir")
+    parser.add_argument("layers", nargs="+", metavar="layer")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--inkscape", default="inkscape")
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    with InkscapePool(args.workers, [args.inkscape]) as pool:
+        futures = {
+            layer: pool.submit(args.input, os.path.join(args.output_dir, layer + ".svg"), layer)
+            for layer in args.layers
+        }
+        for (layer, future) in futures.items():
+            try:
+                logging.info("%s: %.2fs", layer, future.result())
+            except Exception as e:
+                logging.error("%s: %s", layer, e)
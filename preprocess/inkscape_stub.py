@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+ElementTree.register_namespace("", "http://www.w3.org/2000/svg")
+
+BANNER = "Inkscape interactive shell mode. Type 'action-list' to list all actions. Type 'quit' to quit.\n"
+
+
+def export(source: str, target: str, layer: str | None):
+    tree = ElementTree.parse(source)
+    root = tree.getroot()
+    if layer is not None:
+        element = next((element for element in root.iter() if element.get("id") == layer), None)
+        if element is None:
+            print("Object with id=\"{0}\" was not found in the document.".format(layer), file=sys.stderr)
+            return
+        parents = {child: parent for parent in root.iter() for child in parent}
+        while element is not root:
+            parent = parents[element]
+            for child in list(parent):
+                if child is not element:
+                    parent.remove(child)
+            element = parent
+    tree.write(target)
+
+
+def main():
+    if "--shell" not in sys.argv[1:]:
+        print("usage: inkscape_stub.py --shell", file=sys.stderr)
+        sys.exit(2)
+    time.sleep(float(os.environ.get("INKSCAPE_STUB_STARTUP", "0")))
+    crash = os.environ.get("INKSCAPE_STUB_CRASH")
+    delay = float(os.environ.get("INKSCAPE_STUB_DELAY", "0"))
+    sys.stdout.write(BANNER + "> ")
+    sys.stdout.flush()
+    document = None
+    options = {}
+    for line in sys.stdin:
+        line = line.strip()
+        if line == "quit":
+            return
+        for action in filter(None, (action.strip() for action in line.split(";"))):
+            name, _, argument = action.partition(":")
+            if name == "file-open":
+                document = argument
+            elif name == "file-close":
+                document = None
+            elif name == "export-do":
+                if options.get("export-id") == crash:
+                    os._exit(139)
+                time.sleep(delay)
+                export(document, options["export-filename"], options.get("export-id"))
+            else:
+                options[name] = argument
+        sys.stdout.write("> ")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
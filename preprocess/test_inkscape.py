@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from inkscape import ExportError, InkscapePool, InkscapeWorker, shell_argument
+
+STUB = [sys.executable, os.path.join(os.path.dirname(os.path.realpath(__file__)), "inkscape_stub.py")]
+DESIGN = """<svg xmlns="http://www.w3.org/2000/svg" width="210mm" height="297mm" viewBox="0 0 210 297">
+<g id="cut"><path id="a" d="M 10 10 L 50 10 L 50 50 Z"/></g>
+<g id="cut_kiss"><path id="b" d="M 60 60 L 90 60 L 90 90 Z"/></g>
+</svg>
+"""
+
+
+@pytest.fixture
+def source(tmp_path) -> str:
+    path = tmp_path / "design.svg"
+    path.write_text(DESIGN)
+    return str(path)
+
+
+def ids(path: str) -> list[str]:
+    return [element.get("id") for element in ElementTree.parse(path).getroot().iter() if element.get("id")]
+
+
+def test_worker_speaks_the_shell_protocol(source, tmp_path):
+    worker = InkscapeWorker(STUB, timeout=10)
+    try:
+        assert worker.ping()
+        target = str(tmp_path / "cut.svg")
+        worker.export(source, target, "cut", timeout=10)
+        assert ids(target) == ["cut", "a"]
+        assert worker.exports == 1
+        with pytest.raises(ExportError):
+            worker.export(source, str(tmp_path / "missing.svg"), "missing", timeout=10)
+        assert worker.ping()
+    finally:
+        worker.close()
+    assert not worker.alive()
+
+
+def test_shell_arguments_reject_action_separators():
+    with pytest.raises(ExportError):
+        shell_argument("a;b")
+
+
+def test_pool_exports_layers_concurrently(source, tmp_path):
+    with InkscapePool(2, STUB) as pool:
+        futures = {layer: pool.submit(source, str(tmp_path / (layer + ".svg")), layer) for layer in ("cut", "cut_kiss")}
+        for future in futures.values():
+            assert future.result() >= 0
+    assert ids(str(tmp_path / "cut_kiss.svg")) == ["cut_kiss", "b"]
+    assert (pool.starts, pool.restarts, pool.exports, pool.failures) == (2, 0, 2, 0)
+
+
+def test_pool_restarts_a_crashed_worker(source, tmp_path, monkeypatch):
+    monkeypatch.setenv("INKSCAPE_STUB_CRASH", "cut")
+    with InkscapePool(1, STUB, retries=1) as pool:
+        with pytest.raises(Exception, match="exited"):
+            pool.export(source, str(tmp_path / "cut.svg"), "cut")
+        pool.export(source, str(tmp_path / "cut_kiss.svg"), "cut_kiss")
+    assert (pool.starts, pool.restarts, pool.exports, pool.failures) == (3, 2, 1, 1)
+
+
+def test_health_check_replaces_a_dead_idle_worker(source, tmp_path, monkeypatch):
+    monkeypatch.setenv("INKSCAPE_STUB_CRASH", "cut")
+    with InkscapePool(1, STUB, health_interval=0.1, retries=0) as pool:
+        with pytest.raises(Exception):
+            pool.export(source, str(tmp_path / "cut.svg"), "cut")
+        deadline = time.monotonic() + 10
+        while pool.restarts == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert (pool.starts, pool.restarts) == (2, 1)
+        pool.export(source, str(tmp_path / "cut_kiss.svg"), "cut_kiss")
+    assert pool.starts == 2
+
+
+def test_pool_retries_after_a_timeout(source, tmp_path, monkeypatch):
+    monkeypatch.setenv("INKSCAPE_STUB_DELAY", "2")
+    with InkscapePool(1, STUB, timeout=0.3, retries=1) as pool:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            pool.export(source, str(tmp_path / "cut.svg"), "cut")
+        assert time.monotonic() - start < 2
+    assert (pool.starts, pool.restarts, pool.exports, pool.failures) == (2, 1, 0, 1)
+
+    monkeypatch.setenv("INKSCAPE_STUB_DELAY", "0.2")
+    with InkscapePool(1, STUB, timeout=5, retries=1) as pool:
+        pool.export(source, str(tmp_path / "cut.svg"), "cut")
+    assert (pool.restarts, pool.exports) == (0, 1)
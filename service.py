@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import collections
+import hashlib
+import itertools
+import json
+import logging
+import os
+import queue
+import shlex
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Sequence
+
+from pipeline import LAYERS, DesignCache, LayerResult, PreparedDesign, Tools, default_cache_path, error_of, existing, \
+    layer_output, place_design, prepare_design
+from align import main as align
+from inkscape import InkscapePool
+
+STAGES = ("queue", "design", "align", "convert", "total")
+
+
+class Job(NamedTuple):
+    id: int
+    design: str
+    scan: str
+    layers: tuple[str, ...]
+    output: str | None
+    submitted: float
+    future: Future
+
+
+class Latency:
+    def __init__(self, size: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.recent = collections.deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, fraction: float) -> float | None:
+        recent = sorted(self.recent)
+        return recent[min(len(recent) - 1, int(fraction * len(recent)))] if len(recent) > 0 else None
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count > 0 else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.maximum,
+        }
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as reader:
+        for chunk in iter(lambda: reader.read(2 ** 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def layer_response(result: LayerResult, output: str | None) -> dict:
+    response = {"layer": result.layer, "ok": result.ok, "error": result.error, "seconds": result.seconds}
+    if result.ok and output is not None:
+        response["output"] = result.output
+    elif result.ok:
+        with open(result.output, "rb") as reader:
+            response["fcm"] = base64.b64encode(reader.read()).decode()
+    return response
+
+
+class Service:
+    def __init__(
+            self,
+            tools: Tools = Tools(),
+            workers: int = 2,
+            queue_size: int = 8,
+            processes: int | None = None,
+            inkscape_workers: int = 0,
+            inkscape: Sequence[str] = ("inkscape",),
+            native: bool = False,
+            design_cache: DesignCache | None = None,
+            mark_cache=None,
+            designs: int = 16,
+            output_root: str | None = None,
+    ):
+        self.tools = tools
+        self.native = native
+        self.design_cache = design_cache
+        self.mark_cache = mark_cache
+        self.designs = designs
+        self.output_root = os.path.realpath(output_root) if output_root is not None else None
+        self.processes = processes or os.cpu_count()
+        self.lock = threading.Lock()
+        self.executor = self.start_executor()
+        self.pool = InkscapePool(inkscape_workers, inkscape) if inkscape_workers > 0 else None
+        self.prepared: collections.OrderedDict[tuple, Future] = collections.OrderedDict()
+        self.jobs: queue.Queue[Job | None] = queue.Queue(maxsize=queue_size)
+        self.ids = itertools.count(1)
+        self.started = time.perf_counter()
+        self.latency = {stage: Latency() for stage in STAGES}
+        self.running: dict[int, float] = {}
+        self.busy_seconds = 0.0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.design_hits = 0
+        self.design_misses = 0
+        self.executor_restarts = 0
+        self.threads = [threading.Thread(target=self.serve, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def start_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.processes)
+        executor.submit(int).result()
+        return executor
+
+    def restart_executor(self, broken: ProcessPoolExecutor):
+        with self.lock:
+            if self.executor is not broken:
+                return
+            logging.warning("restarting broken worker processes")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self.start_executor()
+            self.executor_restarts += 1
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.latency[stage].record(seconds)
+
+    def forget(self, key: tuple, future: Future):
+        with self.lock:
+            if self.prepared.get(key) is future:
+                del self.prepared[key]
+
+    def design(self, job: Job, executor: ProcessPoolExecutor) -> PreparedDesign:
+        key = (file_digest(job.design), job.layers)
+        with self.lock:
+            future = self.prepared.get(key)
+            owner = future is None
+            if owner:
+                future = self.prepared[key] = Future()
+                self.design_misses += 1
+                while len(self.prepared) > self.designs:
+                    self.prepared.popitem(last=False)
+            else:
+                self.prepared.move_to_end(key)
+                self.design_hits += 1
+        if owner:
+            try:
+                design = prepare_design(
+                    job.design, job.layers, self.tools, self.pool, self.native, self.design_cache, executor,
+                )
+            except Exception as e:
+                self.forget(key, future)
+                future.set_exception(e)
+                raise
+            if not all(layer.paths is not None for layer in design.layers):
+                self.forget(key, future)
+            future.set_result(design)
+        return future.result()
+
+    def run(self, job: Job) -> dict:
+        start = time.perf_counter()
+        executor = self.executor
+        try:
+            aligned = executor.submit(align.align_scan, job.scan, align.DetectionParameters(), self.mark_cache)
+            aligned.add_done_callback(lambda _: self.record("align", time.perf_counter() - start))
+            design = self.design(job, executor)
+            self.record("design", time.perf_counter() - start)
+            transform = align.svg_matrix(aligned.result())
+            convert = time.perf_counter()
+            workdir = tempfile.mkdtemp(prefix="svgalign-")
+            try:
+                directory = job.output or workdir
+                os.makedirs(directory, exist_ok=True)
+                targets = [
+                    os.path.join(directory, os.path.basename(layer_output(job.design, layer))) for layer in job.layers
+                ]
+                results = place_design(design, transform, targets, self.tools, executor=executor)
+                self.record("convert", time.perf_counter() - convert)
+                return {
+                    "id": job.id,
+                    "matrix": transform,
+                    "layers": [layer_response(result, job.output) for result in results],
+                }
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+        except BrokenProcessPool:
+            self.restart_executor(executor)
+            raise
+
+    def serve(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            with self.lock:
+                self.running[job.id] = start
+                self.latency["queue"].record(start - job.submitted)
+            ok = False
+            try:
+                response = self.run(job)
+                ok = any(layer["ok"] for layer in response["layers"])
+                job.future.set_result(response)
+            except Exception as e:
+                job.future.set_exception(e)
+            end = time.perf_counter()
+            with self.lock:
+                del self.running[job.id]
+                self.busy_seconds += end - start
+                self.latency["total"].record(end - job.submitted)
+                self.completed += ok
+                self.failed += not ok
+            logging.info("job %d: %s in %.1fs", job.id, "done" if ok else "failed", end - job.submitted)
+
+    def submit(
+            self,
+            design: str,
+            scan: str,
+            layers: Sequence[str] = LAYERS,
+            output: str | None = None,
+    ) -> Future:
+        design, scan = existing(design, scan)
+        if len(layers) == 0 or not set(layers) <= set(LAYERS):
+            raise ValueError("layers must be a non-empty subset of {0}".format(", ".join(LAYERS)))
+        if output is not None:
+            output = self.output_directory(output)
+        job = Job(next(self.ids), design, scan, tuple(layers), output, time.perf_counter(), Future())
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise
+        return job.future
+
+    def output_directory(self, output: str) -> str:
+        if self.output_root is None:
+            raise ValueError("output directories are disabled")
+        directory = os.path.realpath(os.path.join(self.output_root, output))
+        if os.path.commonpath([self.output_root, directory]) != self.output_root:
+            raise ValueError("output must be inside {0}".format(self.output_root))
+        return directory
+
+    def metrics(self) -> dict:
+        with self.lock:
+            now = time.perf_counter()
+            uptime = now - self.started
+            busy = self.busy_seconds + sum(now - start for start in self.running.values())
+            metrics = {
+                "uptime": uptime,
+                "queue": {"depth": self.jobs.qsize(), "capacity": self.jobs.maxsize},
+                "workers": {
+                    "size": len(self.threads),
+                    "busy": len(self.running),
+                    "utilization": busy / (uptime * len(self.threads)) if len(self.threads) > 0 else 0.0,
+                },
+                "processes": {"size": self.processes, "restarts": self.executor_restarts},
+                "jobs": {"completed": self.completed, "failed": self.failed, "rejected": self.rejected},
+                "designs": {"cached": len(self.prepared), "hits": self.design_hits, "misses": self.design_misses},
+                "latency": {stage: latency.summary() for (stage, latency) in self.latency.items()},
+            }
+        if self.pool is not None:
+            with self.pool.lock:
+                metrics["inkscape"] = {
+                    "size": len(self.pool.threads),
+                    "starts": self.pool.starts,
+                    "restarts": self.pool.restarts,
+                    "exports": self.pool.exports,
+                    "failures": self.pool.failures,
+                }
+        return metrics
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.pool is not None:
+            self.pool.close()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def reply(self, status: int, body: dict, *headers: tuple[str, str]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self.reply(200, self.server.service.metrics())
+        elif self.path == "/health":
+            self.reply(200, {"ok": True})
+        else:
+            self.reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.reply(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            future = self.server.service.submit(
+                request["design"], request["scan"], request.get("layers", LAYERS), request.get("output"),
+            )
+        except queue.Full:
+            self.reply(503, {"error": "job queue is full"}, ("Retry-After", "1"))
+            return
+        except KeyError as e:
+            self.reply(400, {"error": "missing {0}".format(e)})
+            return
+        except (TypeError, ValueError, OSError) as e:
+            self.reply(400, {"error": error_of(e)})
+            return
+        try:
+            response = future.result()
+        except Exception as e:
+            self.reply(422, {"error": error_of(e)})
+            return
+        self.reply(200 if any(layer["ok"] for layer in response["layers"]) else 422, response)
+
+    def log_message(self, format: str, *args):
+        logging.debug(format, *args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--designs", type=int, default=16)
+    parser.add_argument("--preprocess", default=Tools().preprocess)
+    parser.add_argument("--export", default=Tools().export)
+    parser.add_argument("--flatten", default=Tools().flatten)
+    parser.add_argument("--converter", default=Tools().converter)
+    parser.add_argument("--inkscape-workers", type=int, default=0, metavar="N")
+    parser.add_argument("--inkscape", default="inkscape")
+    parser.add_argument("--native-flatten", action="store_true")
+    parser.add_argument("--cache-dir", default=default_cache_path("designs"))
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output-root", metavar="DIR")
+    args = parser.parse_args()
+    tools = Tools(
+        preprocess=os.path.realpath(args.preprocess),
+        export=os.path.realpath(args.export),
+        flatten=os.path.realpath(args.flatten),
+        converter=os.path.realpath(args.converter),
+    )
+    service = Service(
+        tools,
+        args.workers,
+        args.queue_size,
+        args.processes,
+        args.inkscape_workers,
+        shlex.split(args.inkscape),
+        args.native_flatten,
+        None if args.no_cache else DesignCache(args.cache_dir),
+        None if args.no_cache else align.MarkCache(align.default_cache_path()),
+        args.designs,
+        args.output_root,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.service = service
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    logging.info("listening on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import argparse
+import dataclasses
+import io
+import json
+import random
+import re
+import timeit
+import tracemalloc
+from base64 import b64encode
+
+from draw_command import DrawCommand, DrawCommandType
+from fcm import CutDataDto, FileDto, OutlineBezierDto, OutlineLineDto, PathDto, PathFlagsDto, PieceDto, \
+    PieceFlagsDto, PointDto, SegmentBezierDto, SegmentLineDto, ThumbnailDto
+from json_writer import dump
+from path import Path
+
+
+def legacy_path_of(data: str) -> Path:
+    def command_of(command: str, arguments: str) -> DrawCommand:
+        arguments = arguments.strip()
+        arguments = re.split(r" +|,", arguments)
+        arguments = [arg.strip() for arg in arguments]
+        arguments = [float(arg) for arg in arguments if len(arg) != 0]
+        return DrawCommand(DrawCommandType(command.upper()), command.isupper(), arguments)
+
+    commands = []
+    last_index = 0
+    index = 0
+    while index < len(data):
+        char = data[index]
+        if DrawCommandType.has(char.upper()):
+            if last_index < index:
+                commands.append(command_of(data[last_index], data[last_index + 1:index]))
+            last_index = index
+        index += 1
+    if last_index < index:
+        commands.append(command_of(data[last_index], data[last_index + 1:index]))
+    return Path(commands)
+
+
+def synthetic_path_data(segments: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+
+    def point() -> str:
+        return "{0:.3f},{1:.3f}".format(rng.uniform(0, 210), rng.uniform(0, 297))
+
+    parts = ["M " + point()]
+    for _ in range(segments):
+        command = rng.choice("LLHVCCSQ")
+        if command in "HV":
+            parts.append("{0} {1:.3f}".format(command, rng.uniform(0, 210)))
+        elif command == "C":
+            parts.append("C {0} {1} {2}".format(point(), point(), point()))
+        elif command in "SQ":
+            parts.append("{0} {1} {2}".format(command, point(), point()))
+        else:
+            parts.append("L " + point())
+    parts.append("Z")
+    return " ".join(parts)
+
+
+def benchmark_path(segments: int, repeat: int):
+    data = synthetic_path_data(segments)
+    assert [list(command.arguments) for command in Path.of(data).commands] == \
+           [list(command.arguments) for command in legacy_path_of(data).commands]
+    print("path data: {0} segments, {1:.0f} KiB".format(segments, len(data) / 1024))
+    for name, parse in [("legacy", legacy_path_of), ("tokenizer", Path.of)]:
+        seconds = min(timeit.repeat(lambda: parse(data), number=1, repeat=repeat))
+        print("{0:<10} {1:>8.1f} ms {2:>8.1f} MiB/s".format(name, seconds * 1000, len(data) / seconds / 2 ** 20))
+
+
+class LegacyJsonEncoder(json.JSONEncoder):
+    def default(self, o):
+        if dataclasses.is_dataclass(o):
+            return dataclasses.asdict(o)
+        if isinstance(o, bytes):
+            return b64encode(o).decode()
+        return super().default(o)
+
+
+def legacy_dump(value, writer):
+    json.dump(value, writer, cls=LegacyJsonEncoder)
+
+
+def synthetic_design(paths: int, segments: int, seed: int = 0) -> FileDto:
+    rng = random.Random(seed)
+
+    def point() -> PointDto:
+        return PointDto(rng.randint(-15000, 15000), rng.randint(-15000, 15000))
+
+    def outline():
+        if rng.random() < 0.5:
+            return OutlineLineDto([SegmentLineDto(point()) for _ in range(segments)])
+        return OutlineBezierDto([SegmentBezierDto(point(), point(), point()) for _ in range(segments)])
+
+    piece = PieceDto(
+        30000, 30000, 0, 0, (1.0, 0.0, 0.0, 1.0, 0.0, 0.0), PieceFlagsDto(seam_allowance_locked=True), "",
+        [PathDto(PathFlagsDto(open=False, tool_cut=True), point(), [outline() for _ in range(3)]) for _ in range(paths)],
+    )
+    return FileDto(400000002, "", " ", " ", " ", CutDataDto(0, 29667, 29880, 2000), ThumbnailDto(3, 3, bytes(1118)), [piece])
+
+
+def benchmark_json(paths: int, segments: int, repeat: int):
+    design = synthetic_design(paths, segments)
+    legacy, streamed = io.StringIO(), io.StringIO()
+    legacy_dump(design, legacy)
+    dump(design, streamed)
+    assert legacy.getvalue() == streamed.getvalue()
+    print("design: {0} paths, {1:.1f} MiB of JSON".format(paths, len(streamed.getvalue()) / 2 ** 20))
+    for name, write in [("asdict", legacy_dump), ("streaming", dump)]:
+        seconds = min(timeit.repeat(lambda: write(design, NullWriter()), number=1, repeat=repeat))
+        tracemalloc.start()
+        write(design, NullWriter())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("{0:<10} {1:>8.1f} ms {2:>8.1f} MiB peak".format(name, seconds * 1000, peak / 2 ** 20))
+
+
+class NullWriter:
+    def write(self, data: str) -> int:
+        return len(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+    path_parser = benchmarks.add_parser("path")
+    path_parser.add_argument("--segments", type=int, default=20000)
+    path_parser.add_argument("--repeat", type=int, default=5)
+    json_parser = benchmarks.add_parser("json")
+    json_parser.add_argument("--paths", type=int, default=5000)
+    json_parser.add_argument("--segments", type=int, default=8)
+    json_parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if args.benchmark == "path":
+        benchmark_path(args.segments, args.repeat)
+    elif args.benchmark == "json":
+        benchmark_json(args.paths, args.segments, args.repeat)
@@ -1,135 +1,75 @@
-from typing import NamedTuple
+from array import array
+from itertools import accumulate
+from typing import Iterator, NamedTuple, Sequence
 
-from coordinate import Coordinate
-from draw_command import DrawCommand, DrawCommandType
+from draw_command import DrawCommandType
 from path import Path
 
 
-def list_window(collection: list, size: int) -> list[tuple]:
-    return [tuple(collection[i:i + size]) for i in range(0, len(collection) - size + 1, size)]
+POINT_WINDOWS = {
+    DrawCommandType.LINE: (2, 0),
+    DrawCommandType.BEZIER: (6, 4),
+    DrawCommandType.BEZIER_SYMMETRIC: (4, 2),
+    DrawCommandType.QUADRATIC: (4, 2),
+    DrawCommandType.QUADRATIC_SYMMETRIC: (2, 0),
+    DrawCommandType.ARC: (7, 5),
+}
 
 
-class Contour(NamedTuple):
-    points: list[Coordinate]
-    closed: bool
-
-    def min_x(self) -> float:
-        return min(x for (x, _) in self.points)
-
-    def min_y(self) -> float:
-        return min(y for (_, y) in self.points)
-
-    def max_x(self) -> float:
-        return max(x for (x, _) in self.points)
-
-    def max_y(self) -> float:
-        return max(y for (_, y) in self.points)
-
-    def bounding_box(self):
-        return Contour([
-            Coordinate(self.min_x(), self.min_y()),
-            Coordinate(self.max_x(), self.min_y()),
-            Coordinate(self.max_x(), self.max_y()),
-            Coordinate(self.min_x(), self.max_y()),
-        ], True)
-
-    def to_path(self) -> Path:
-        arguments = []
-        for (x, y) in self.points:
-            arguments.append(x)
-            arguments.append(y)
-
-        if self.closed:
-            return Path([
-                DrawCommand(DrawCommandType.MOVE, True, arguments),
-                DrawCommand(DrawCommandType.CLOSE)
-            ])
-        else:
-            return Path([
-                DrawCommand(DrawCommandType.MOVE, True, arguments),
-            ])
+class Bounds(NamedTuple):
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
 
     @staticmethod
     def of(path: Path):
-        outlines: list[Contour] = []
-        points: list[Coordinate] = []
-
-        def last_point() -> Coordinate:
-            if len(points) > 0:
-                return points[-1]
-            if len(outlines) > 0:
-                return outlines[-1].points[-1]
-            else:
-                return Coordinate(0, 0)
-
+        all_xs = array("d")
+        all_ys = array("d")
+        x = y = 0.0
+        start: tuple[float, float] | None = None
         for command in path.commands:
-            if command.type == DrawCommandType.MOVE:
-                if len(points) != 0:
-                    outlines.append(Contour(points, False))
-                    points = []
-                for (x, y) in list_window(command.arguments, 2):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
-            elif command.type == DrawCommandType.LINE:
-                for (x, y) in list_window(command.arguments, 2):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
+            arguments = command.arguments
+            window = POINT_WINDOWS.get(command.type)
+            if window is None and command.type == DrawCommandType.MOVE:
+                start = None
+                window = (2, 0)
+            if window is not None:
+                size, index = window
+                count = len(arguments) // size * size
+                if count == 0:
+                    continue
+                xs = arguments[index:count:size]
+                ys = arguments[index + 1:count:size]
+                if not command.absolute:
+                    xs = array("d", accumulated(xs, x))
+                    ys = array("d", accumulated(ys, y))
             elif command.type == DrawCommandType.HORIZONTAL_LINE:
-                for x in command.arguments:
-                    previous = last_point()
-                    if command.absolute:
-                        point = Coordinate(x, previous.y)
-                    else:
-                        point = Coordinate(x + previous.x, previous.y)
-                    points.append(point)
+                if len(arguments) == 0:
+                    continue
+                xs = arguments if command.absolute else array("d", accumulated(arguments, x))
+                ys = array("d", [y])
             elif command.type == DrawCommandType.VERTICAL_LINE:
-                for y in command.arguments:
-                    previous = last_point()
-                    if command.absolute:
-                        point = Coordinate(previous.x, y)
-                    else:
-                        point = Coordinate(previous.x, y + previous.y)
-                    points.append(point)
-            elif command.type == DrawCommandType.BEZIER:
-                for (_, _, _, _, x, y) in list_window(command.arguments, 6):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
-            elif command.type == DrawCommandType.BEZIER_SYMMETRIC:
-                for (_, _, x, y) in list_window(command.arguments, 4):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
-            elif command.type == DrawCommandType.QUADRATIC:
-                for (_, _, x, y) in list_window(command.arguments, 4):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
-            elif command.type == DrawCommandType.QUADRATIC_SYMMETRIC:
-                for (x, y) in list_window(command.arguments, 2):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
-            elif command.type == DrawCommandType.ARC:
-                for (_, _, _, _, _, x, y) in list_window(command.arguments, 7):
-                    point = Coordinate(x, y)
-                    if not command.absolute:
-                        point += last_point()
-                    points.append(point)
-            elif command.type == DrawCommandType.CLOSE:
-                if len(points) != 0:
-                    if len(points) > 1:
-                        points.append(points[0])
-                    outlines.append(Contour(points, True))
-                    points = []
-        if len(points) != 0:
-            outlines.append(Contour(points, False))
-        return outlines
+                if len(arguments) == 0:
+                    continue
+                xs = array("d", [x])
+                ys = arguments if command.absolute else array("d", accumulated(arguments, y))
+            else:
+                if command.type == DrawCommandType.CLOSE and start is not None:
+                    x, y = start
+                    start = None
+                continue
+            if start is None:
+                start = (xs[0], ys[0])
+            all_xs += xs
+            all_ys += ys
+            x, y = xs[-1], ys[-1]
+        if len(all_xs) == 0:
+            return None
+        return Bounds(min(all_xs), min(all_ys), max(all_xs), max(all_ys))
+
+
+def accumulated(values: Sequence[float], start: float) -> Iterator[float]:
+    values = accumulate(values, initial=start)
+    next(values)
+    return values
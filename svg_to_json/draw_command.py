@@ -1,6 +1,16 @@
 import enum
 import re
-from typing import NamedTuple
+from array import array
+from typing import NamedTuple, Sequence
+
+NUMBER = r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?"
+FLAG = r"[01]"
+SEPARATOR = r"[\s,]*"
+NUMBERS = re.compile(NUMBER)
+PLAIN_NUMBERS = re.compile(r"[\d\s,.eE+-]*")
+ARC_ARGUMENTS = re.compile(SEPARATOR.join(
+    "({0})".format(part) for part in [NUMBER, NUMBER, NUMBER, FLAG, FLAG, NUMBER, NUMBER]
+))
 
 
 class DrawCommandType(enum.StrEnum):
@@ -23,7 +33,7 @@ class DrawCommandType(enum.StrEnum):
 class DrawCommand(NamedTuple):
     type: DrawCommandType
     absolute: bool = True
-    arguments: list[float] = []
+    arguments: Sequence[float] = []
 
     def to_string(self) -> str:
         command_type = self.type.value
@@ -36,9 +46,24 @@ class DrawCommand(NamedTuple):
         )
 
     @staticmethod
-    def of(command: str, arguments: str):
-        arguments = arguments.strip()
-        arguments = re.split(r" +|,", arguments)
-        arguments = [arg.strip() for arg in arguments]
-        arguments = [float(arg) for arg in arguments if len(arg) != 0]
-        return DrawCommand(DrawCommandType(command.upper()), command.isupper(), arguments)
+    def of(command: str, arguments: str, plain: bool = False):
+        command_type, absolute = COMMAND_TYPES[command]
+        if command_type is DrawCommandType.ARC:
+            values = array("d", (float(arg) for group in ARC_ARGUMENTS.findall(arguments) for arg in group))
+        else:
+            values = None
+            if plain or PLAIN_NUMBERS.fullmatch(arguments):
+                try:
+                    values = array("d", map(float, arguments.replace(",", " ").split()))
+                except ValueError:
+                    pass
+            if values is None:
+                values = array("d", map(float, NUMBERS.findall(arguments)))
+        return DrawCommand(command_type, absolute, values)
+
+
+COMMAND_TYPES = {
+    letter: (command_type, letter.isupper())
+    for command_type in DrawCommandType
+    for letter in (command_type.value, command_type.value.lower())
+}
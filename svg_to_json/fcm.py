@@ -1,8 +1,11 @@
+import abc
 import enum
+from array import array
 from dataclasses import dataclass
+from typing import Iterable, Sequence
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PointDto:
     x: int
     y: int
@@ -17,39 +20,84 @@ class PointDto:
         return PointDto(int(round(self.x * other)), int(round(self.y * other)))
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SegmentLineDto:
     end: PointDto
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SegmentBezierDto:
     control1: PointDto
     control2: PointDto
     end: PointDto
 
 
+class PackedSegments(Sequence, abc.ABC):
+    __slots__ = ("coordinates",)
+    stride = 2
+
+    def __init__(self, coordinates: Iterable[int]):
+        self.coordinates = array("q", coordinates)
+
+    @abc.abstractmethod
+    def segment(self, values: array):
+        pass
+
+    def __len__(self) -> int:
+        return len(self.coordinates) // self.stride
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start = range(0, len(self) * self.stride, self.stride)[index]
+        return self.segment(self.coordinates[start:start + self.stride])
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "{0}({1!r})".format(type(self).__name__, list(self))
+
+
+class LineSegments(PackedSegments):
+    __slots__ = ()
+    stride = 2
+
+    def segment(self, values: array) -> SegmentLineDto:
+        return SegmentLineDto(PointDto(values[0], values[1]))
+
+
+class BezierSegments(PackedSegments):
+    __slots__ = ()
+    stride = 6
+
+    def segment(self, values: array) -> SegmentBezierDto:
+        return SegmentBezierDto(PointDto(values[0], values[1]), PointDto(values[2], values[3]), PointDto(values[4], values[5]))
+
+
 class OutlineTypeDto(enum.StrEnum):
     LINE = "line"
     BEZIER = "bezier"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OutlineLineDto:
-    segments: list[SegmentLineDto]
+    segments: Sequence[SegmentLineDto]
     type: OutlineTypeDto = OutlineTypeDto.LINE
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OutlineBezierDto:
-    segments: list[SegmentBezierDto]
+    segments: Sequence[SegmentBezierDto]
     type: OutlineTypeDto = OutlineTypeDto.BEZIER
 
 
 OutlineDto = OutlineLineDto | OutlineBezierDto
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PathFlagsDto:
     open: bool = False
     fill: bool = False
@@ -64,14 +112,14 @@ class PathFlagsDto:
     tool_perforating: bool = False
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PathDto:
     flags: PathFlagsDto
     start: PointDto
     outlines: list[OutlineDto]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PieceFlagsDto:
     licensed: bool = False
     seam_allowance_enabled: bool = False
@@ -82,7 +130,7 @@ class PieceFlagsDto:
     tool_locked: bool = False
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PieceDto:
     width: int
     height: int
@@ -94,7 +142,7 @@ class PieceDto:
     paths: list[PathDto]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CutDataDto:
     mat_id: int
     cut_width: int
@@ -102,14 +150,14 @@ class CutDataDto:
     seam_allowance_width: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ThumbnailDto:
     block_width: int
     block_height: int
     data: bytes
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FileDto:
     content_id: int
     short_name: str
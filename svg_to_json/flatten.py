@@ -0,0 +1,408 @@
+import math
+import re
+from array import array
+import xml.etree.ElementTree as ElementTree
+from typing import BinaryIO, Iterable, Iterator, Sequence
+
+from draw_command import NUMBERS, DrawCommand, DrawCommandType
+from path import Path
+from svg import PathData, Scope, local_name
+
+OUTPUT_WIDTH = 210
+OUTPUT_HEIGHT = 297
+
+Matrix = tuple[float, float, float, float, float, float]
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+TRANSFORMS = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+LENGTH = re.compile(r"\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)\s*(px|pt|pc|mm|cm|in|Q|%)?\s*$")
+UNITS = {None: 1.0, "px": 1.0, "pt": 96 / 72, "pc": 16.0, "mm": 96 / 25.4, "cm": 96 / 2.54, "in": 96.0, "Q": 96 / 101.6}
+HIDDEN = {"defs", "clipPath", "mask", "marker", "pattern", "symbol", "metadata", "title", "desc", "style", "script"}
+SHAPES = {"path", "rect", "circle", "ellipse", "line", "polyline", "polygon"}
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+WINDOWS = {
+    DrawCommandType.MOVE: 2,
+    DrawCommandType.LINE: 2,
+    DrawCommandType.BEZIER: 6,
+}
+CURVE_WINDOWS = {
+    DrawCommandType.BEZIER_SYMMETRIC: 4,
+    DrawCommandType.QUADRATIC: 4,
+    DrawCommandType.QUADRATIC_SYMMETRIC: 2,
+}
+PRECISION = 12
+
+
+def multiply(m: Matrix, n: Matrix) -> Matrix:
+    return (
+        m[0] * n[0] + m[2] * n[1],
+        m[1] * n[0] + m[3] * n[1],
+        m[0] * n[2] + m[2] * n[3],
+        m[1] * n[2] + m[3] * n[3],
+        m[0] * n[4] + m[2] * n[5] + m[4],
+        m[1] * n[4] + m[3] * n[5] + m[5],
+    )
+
+
+def invert(m: Matrix) -> Matrix:
+    determinant = m[0] * m[3] - m[1] * m[2]
+    if determinant == 0:
+        raise Exception("matrix is not invertible")
+    a, b, c, d = m[3] / determinant, -m[1] / determinant, -m[2] / determinant, m[0] / determinant
+    return a, b, c, d, -(a * m[4] + c * m[5]), -(b * m[4] + d * m[5])
+
+
+def transform_of(name: str, values: list[float]) -> Matrix:
+    if name == "matrix" and len(values) == 6:
+        return tuple(values)
+    elif name == "translate" and len(values) in (1, 2):
+        return 1.0, 0.0, 0.0, 1.0, values[0], values[1] if len(values) == 2 else 0.0
+    elif name == "scale" and len(values) in (1, 2):
+        return values[0], 0.0, 0.0, values[-1], 0.0, 0.0
+    elif name == "rotate" and len(values) in (1, 3):
+        angle = math.radians(values[0])
+        rotation = (math.cos(angle), math.sin(angle), -math.sin(angle), math.cos(angle), 0.0, 0.0)
+        if len(values) == 1:
+            return rotation
+        cx, cy = values[1], values[2]
+        return multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), rotation), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+    elif name == "skewX" and len(values) == 1:
+        return 1.0, 0.0, math.tan(math.radians(values[0])), 1.0, 0.0, 0.0
+    elif name == "skewY" and len(values) == 1:
+        return 1.0, math.tan(math.radians(values[0])), 0.0, 1.0, 0.0, 0.0
+    raise Exception("invalid transform: {0}({1})".format(name, ", ".join(map(str, values))))
+
+
+def parse_transform(value: str | None) -> Matrix:
+    matrix = IDENTITY
+    for (name, arguments) in TRANSFORMS.findall(value or ""):
+        matrix = multiply(matrix, transform_of(name, [float(value) for value in NUMBERS.findall(arguments)]))
+    return matrix
+
+
+def parse_length(value: str | None) -> float | None:
+    match = LENGTH.match(value or "")
+    if match is None or match.group(2) == "%":
+        return None
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+
+def view_box_matrix(view_box: Sequence[float], width: float, height: float, preserve: str) -> Matrix:
+    x, y, box_width, box_height = view_box
+    sx, sy = width / box_width, height / box_height
+    align, _, mode = preserve.strip().partition(" ")
+    if align != "none":
+        sx = sy = max(sx, sy) if mode.strip() == "slice" else min(sx, sy)
+    tx, ty = -x * sx, -y * sy
+    if "xMid" in align:
+        tx += (width - box_width * sx) / 2
+    elif "xMax" in align:
+        tx += width - box_width * sx
+    if "YMid" in align:
+        ty += (height - box_height * sy) / 2
+    elif "YMax" in align:
+        ty += height - box_height * sy
+    return sx, 0.0, 0.0, sy, tx, ty
+
+
+def document_matrix(root: ElementTree.Element, output_width: float, output_height: float) -> Matrix:
+    view_box = [float(value) for value in NUMBERS.findall(root.get("viewBox", ""))]
+    if len(view_box) != 4 or view_box[2] <= 0 or view_box[3] <= 0:
+        view_box = None
+    width = parse_length(root.get("width"))
+    height = parse_length(root.get("height"))
+    if width is None:
+        width = view_box[2] if view_box is not None else output_width
+    if height is None:
+        height = view_box[3] if view_box is not None else output_height
+    matrix = (output_width / width, 0.0, 0.0, output_height / height, 0.0, 0.0)
+    if view_box is not None:
+        matrix = multiply(matrix, view_box_matrix(view_box, width, height, root.get("preserveAspectRatio", "xMidYMid")))
+    return matrix
+
+
+def hidden(element: ElementTree.Element) -> bool:
+    if element.get("display") == "none":
+        return True
+    style = element.get("style", "")
+    return "display" in style and any(
+        name.strip() == "display" and value.strip() == "none"
+        for (name, _, value) in (item.partition(":") for item in style.split(";"))
+    )
+
+
+def number(element: ElementTree.Element, name: str) -> float:
+    return parse_length(element.get(name)) or 0.0
+
+
+def command(command_type: DrawCommandType, *arguments: float) -> DrawCommand:
+    return DrawCommand(command_type, True, array("d", arguments))
+
+
+def shape_path(element: ElementTree.Element, tag: str) -> Path | None:
+    if tag == "path":
+        return Path.of(element.get("d", ""))
+    elif tag == "rect":
+        x, y, width, height = (number(element, name) for name in ("x", "y", "width", "height"))
+        if width <= 0 or height <= 0:
+            return None
+        rx, ry = parse_length(element.get("rx")), parse_length(element.get("ry"))
+        rx = min(max(rx if rx is not None else ry or 0.0, 0.0), width / 2)
+        ry = min(max(ry if ry is not None else rx, 0.0), height / 2)
+        if rx == 0 or ry == 0:
+            return Path([
+                command(DrawCommandType.MOVE, x, y),
+                command(DrawCommandType.HORIZONTAL_LINE, x + width),
+                command(DrawCommandType.VERTICAL_LINE, y + height),
+                command(DrawCommandType.HORIZONTAL_LINE, x),
+                command(DrawCommandType.CLOSE),
+            ])
+        return Path([
+            command(DrawCommandType.MOVE, x + rx, y),
+            command(DrawCommandType.HORIZONTAL_LINE, x + width - rx),
+            command(DrawCommandType.ARC, rx, ry, 0, 0, 1, x + width, y + ry),
+            command(DrawCommandType.VERTICAL_LINE, y + height - ry),
+            command(DrawCommandType.ARC, rx, ry, 0, 0, 1, x + width - rx, y + height),
+            command(DrawCommandType.HORIZONTAL_LINE, x + rx),
+            command(DrawCommandType.ARC, rx, ry, 0, 0, 1, x, y + height - ry),
+            command(DrawCommandType.VERTICAL_LINE, y + ry),
+            command(DrawCommandType.ARC, rx, ry, 0, 0, 1, x + rx, y),
+            command(DrawCommandType.CLOSE),
+        ])
+    elif tag in ("circle", "ellipse"):
+        cx, cy = number(element, "cx"), number(element, "cy")
+        if tag == "circle":
+            rx = ry = number(element, "r")
+        else:
+            rx, ry = number(element, "rx"), number(element, "ry")
+        if rx <= 0 or ry <= 0:
+            return None
+        return Path([
+            command(DrawCommandType.MOVE, cx + rx, cy),
+            command(DrawCommandType.ARC, rx, ry, 0, 0, 1, cx - rx, cy),
+            command(DrawCommandType.ARC, rx, ry, 0, 0, 1, cx + rx, cy),
+            command(DrawCommandType.CLOSE),
+        ])
+    elif tag == "line":
+        return Path([
+            command(DrawCommandType.MOVE, number(element, "x1"), number(element, "y1")),
+            command(DrawCommandType.LINE, number(element, "x2"), number(element, "y2")),
+        ])
+    points = [float(value) for value in NUMBERS.findall(element.get("points", ""))]
+    points = points[:len(points) // 2 * 2]
+    if len(points) < 4:
+        return None
+    commands = [command(DrawCommandType.MOVE, *points[:2]), command(DrawCommandType.LINE, *points[2:])]
+    if tag == "polygon":
+        commands.append(command(DrawCommandType.CLOSE))
+    return Path(commands)
+
+
+def arc_to_cubics(x1: float, y1: float, arguments: Sequence[float]) -> list[float]:
+    rx, ry, rotation, large, sweep, x2, y2 = arguments
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        return [x1, y1, x2, y2, x2, y2]
+    phi = math.radians(rotation)
+    cos, sin = math.cos(phi), math.sin(phi)
+    dx, dy = (x1 - x2) / 2, (y1 - y2) / 2
+    px, py = cos * dx + sin * dy, -sin * dx + cos * dy
+    scale = (px * px) / (rx * rx) + (py * py) / (ry * ry)
+    if scale > 1:
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+    numerator = rx * rx * ry * ry - rx * rx * py * py - ry * ry * px * px
+    denominator = rx * rx * py * py + ry * ry * px * px
+    factor = math.sqrt(max(0.0, numerator / denominator))
+    if large == sweep:
+        factor = -factor
+    cpx, cpy = factor * rx * py / ry, -factor * ry * px / rx
+    cx = cos * cpx - sin * cpy + (x1 + x2) / 2
+    cy = sin * cpx + cos * cpy + (y1 + y2) / 2
+    start = math.atan2((py - cpy) / ry, (px - cpx) / rx)
+    delta = math.atan2((-py - cpy) / ry, (-px - cpx) / rx) - start
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+    count = max(1, math.ceil(abs(delta) / (math.pi / 2) - 1e-9))
+    step = delta / count
+    k = 4 / 3 * math.tan(step / 4)
+    values = []
+    for i in range(count):
+        a1, a2 = start + i * step, start + (i + 1) * step
+        e1 = (math.cos(a1) - k * math.sin(a1), math.sin(a1) + k * math.cos(a1))
+        e2 = (math.cos(a2) + k * math.sin(a2), math.sin(a2) - k * math.cos(a2))
+        e3 = (math.cos(a2), math.sin(a2))
+        for (ex, ey) in (e1, e2, e3):
+            values.append(cx + rx * ex * cos - ry * ey * sin)
+            values.append(cy + rx * ex * sin + ry * ey * cos)
+    values[-2:] = [x2, y2]
+    return values
+
+
+def normalized(matrix: Matrix) -> Matrix:
+    return tuple(round(value, PRECISION) + 0.0 for value in matrix)
+
+
+def curve_to_cubics(
+        draw: DrawCommand,
+        x: float,
+        y: float,
+        cubic: tuple[float, float] | None,
+        quadratic: tuple[float, float] | None,
+) -> tuple[list[float], tuple[float, float] | None, tuple[float, float] | None]:
+    size = CURVE_WINDOWS[draw.type]
+    arguments = draw.arguments
+    values = []
+    for i in range(0, len(arguments) - size + 1, size):
+        points = list(arguments[i:i + size])
+        if not draw.absolute:
+            points[0::2] = [value + x for value in points[0::2]]
+            points[1::2] = [value + y for value in points[1::2]]
+        end_x, end_y = points[-2], points[-1]
+        if draw.type == DrawCommandType.BEZIER_SYMMETRIC:
+            control_x, control_y = (2 * x - cubic[0], 2 * y - cubic[1]) if cubic is not None else (x, y)
+            values += (control_x, control_y, *points)
+            cubic, quadratic = (points[0], points[1]), None
+        else:
+            if draw.type == DrawCommandType.QUADRATIC:
+                control_x, control_y = points[0], points[1]
+            elif quadratic is not None:
+                control_x, control_y = 2 * x - quadratic[0], 2 * y - quadratic[1]
+            else:
+                control_x, control_y = x, y
+            values += (
+                x + (control_x - x) * 2 / 3,
+                y + (control_y - y) * 2 / 3,
+                end_x + (control_x - end_x) * 2 / 3,
+                end_y + (control_y - end_y) * 2 / 3,
+                end_x,
+                end_y,
+            )
+            cubic, quadratic = None, (control_x, control_y)
+        x, y = end_x, end_y
+    return values, cubic, quadratic
+
+
+def transform_points(matrix: Matrix, values: Sequence[float]) -> array:
+    a, b, c, d, e, f = matrix
+    xs, ys = values[0:len(values) // 2 * 2:2], values[1::2]
+    result = array("d", bytes(16 * len(ys)))
+    result[0::2] = array("d", [a * x + c * y + e for (x, y) in zip(xs, ys)])
+    result[1::2] = array("d", [b * x + d * y + f for (x, y) in zip(xs, ys)])
+    return result
+
+
+def flatten_path(path: Path, matrix: Matrix) -> Path:
+    commands = []
+    x = y = start_x = start_y = 0.0
+    cubic = quadratic = None
+    closed = False
+    matrix = normalized(matrix)
+    axis_aligned = matrix[1] == 0 and matrix[2] == 0
+    for draw in path.commands:
+        arguments = draw.arguments
+        if closed and draw.type != DrawCommandType.MOVE:
+            commands.append(DrawCommand(DrawCommandType.MOVE, True, transform_points(matrix, (x, y))))
+        closed = False
+        if draw.type in CURVE_WINDOWS:
+            values, cubic, quadratic = curve_to_cubics(draw, x, y, cubic, quadratic)
+            if len(values) > 0:
+                x, y = values[-2], values[-1]
+                commands.append(DrawCommand(DrawCommandType.BEZIER, True, transform_points(matrix, values)))
+            continue
+        cubic = quadratic = None
+        if draw.type == DrawCommandType.CLOSE:
+            commands.append(command(DrawCommandType.CLOSE))
+            x, y = start_x, start_y
+            closed = True
+        elif draw.type in (DrawCommandType.HORIZONTAL_LINE, DrawCommandType.VERTICAL_LINE):
+            horizontal = draw.type == DrawCommandType.HORIZONTAL_LINE
+            points = []
+            for value in arguments:
+                if horizontal:
+                    x = value if draw.absolute else x + value
+                else:
+                    y = value if draw.absolute else y + value
+                points += (x, y)
+            if axis_aligned:
+                values = transform_points(matrix, points)[0 if horizontal else 1::2]
+                commands.append(DrawCommand(draw.type, True, values))
+            else:
+                commands.append(DrawCommand(DrawCommandType.LINE, True, transform_points(matrix, points)))
+        elif draw.type == DrawCommandType.ARC:
+            values = []
+            for i in range(0, len(arguments) - 6, 7):
+                window = list(arguments[i:i + 7])
+                if not draw.absolute:
+                    window[5] += x
+                    window[6] += y
+                if (window[5], window[6]) != (x, y):
+                    values += arc_to_cubics(x, y, window)
+                x, y = window[5], window[6]
+            if len(values) > 0:
+                commands.append(DrawCommand(DrawCommandType.BEZIER, True, transform_points(matrix, values)))
+        else:
+            size = WINDOWS[draw.type]
+            points = list(arguments[:len(arguments) // 2 * 2])
+            if not draw.absolute:
+                for i in range(0, len(points) - size + 1, size):
+                    for j in range(i, i + size, 2):
+                        points[j] += x
+                        points[j + 1] += y
+                    x, y = points[i + size - 2], points[i + size - 1]
+            elif len(points) >= 2:
+                x, y = points[-2], points[-1]
+            if draw.type == DrawCommandType.MOVE and len(points) >= 2:
+                start_x, start_y = points[0], points[1]
+            elif draw.type == DrawCommandType.BEZIER and len(points) >= size:
+                cubic = points[len(points) // size * size - 4], points[len(points) // size * size - 3]
+            commands.append(DrawCommand(draw.type, True, transform_points(matrix, points)))
+    return Path(commands)
+
+
+def format_path(path: Path) -> str:
+    return " ".join(
+        " ".join([draw.type.value, *map(float.__repr__, draw.arguments)])
+        for draw in path.commands
+    )
+
+
+def flatten_paths(
+        source: str | BinaryIO,
+        output_width: float = OUTPUT_WIDTH,
+        output_height: float = OUTPUT_HEIGHT,
+) -> Iterator[PathData]:
+    root = ElementTree.parse(source).getroot()
+    elements = {element.get("id"): element for element in root.iter() if element.get("id")}
+    index = 0
+    stack = [(root, document_matrix(root, output_width, output_height), (), frozenset())]
+    while len(stack) > 0:
+        element, matrix, scopes, used = stack.pop()
+        tag = local_name(element.tag) if isinstance(element.tag, str) else ""
+        if tag in HIDDEN or hidden(element):
+            continue
+        if element is not root:
+            matrix = multiply(matrix, parse_transform(element.get("transform")))
+        scopes += (Scope(tag, element.get("id", ""), index),)
+        index += 1
+        if tag in SHAPES:
+            path = shape_path(element, tag)
+            if path is not None:
+                yield PathData(format_path(flatten_path(path, matrix)), scopes)
+        elif tag == "use":
+            reference = (element.get("href") or element.get(XLINK_HREF) or "").lstrip("#")
+            target = elements.get(reference)
+            if target is not None and reference not in used:
+                offset = (1.0, 0.0, 0.0, 1.0, number(element, "x"), number(element, "y"))
+                children = list(target) if local_name(target.tag) == "symbol" else [target]
+                for child in reversed(children):
+                    stack.append((child, multiply(matrix, offset), scopes, used | {reference}))
+        else:
+            for child in reversed(element):
+                stack.append((child, matrix, scopes, used))
+
+
+def transform_paths(paths: Iterable[PathData], matrix: Matrix) -> Iterator[PathData]:
+    for path in paths:
+        yield PathData(flatten_path(Path.of(path.data), matrix), path.scopes)
@@ -0,0 +1,143 @@
+import dataclasses
+import math
+from base64 import b64encode
+from json.encoder import encode_basestring_ascii
+from typing import TextIO
+
+from fcm import BezierSegments, LineSegments, OutlineBezierDto, OutlineDto, OutlineLineDto, PackedSegments, PathDto, \
+    PathFlagsDto, PointDto, SegmentBezierDto, SegmentLineDto
+
+
+POINT = '{"x": %d, "y": %d}'
+SEGMENT_FORMATS = {
+    LineSegments: '{"end": ' + POINT + "}",
+    BezierSegments: '{"control1": ' + POINT + ', "control2": ' + POINT + ', "end": ' + POINT + "}",
+}
+
+
+def encode_float(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if value == math.inf:
+        return "Infinity"
+    if value == -math.inf:
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def encode_scalar(value) -> str:
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return encode_float(value)
+    if isinstance(value, bytes):
+        return encode_basestring_ascii(b64encode(value).decode())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_point(point: PointDto) -> str:
+    x, y = point.x, point.y
+    if type(x) is int and type(y) is int:
+        return '{"x": ' + int.__repr__(x) + ', "y": ' + int.__repr__(y) + "}"
+    return '{"x": ' + encode_scalar(x) + ', "y": ' + encode_scalar(y) + "}"
+
+
+def encode_segments(segments: PackedSegments) -> str:
+    values = iter(segments.coordinates)
+    return "[" + ", ".join(map(SEGMENT_FORMATS[type(segments)].__mod__, zip(*[values] * segments.stride))) + "]"
+
+
+def encode_outline(outline: OutlineDto) -> str:
+    return '{"segments": ' + encode_segments(outline.segments) + ', "type": ' + encode_basestring_ascii(outline.type) + "}"
+
+
+class JsonWriter:
+    def __init__(self, writer: TextIO, buffer_size: int = 2 ** 14):
+        self.writer = writer
+        self.buffer_size = buffer_size
+        self.chunks: list[str] = []
+        self.keys: dict[type, list[tuple[str, str]] | None] = {}
+        self.flags: dict[PathFlagsDto, str] = {}
+
+    def fields(self, cls: type) -> list[tuple[str, str]] | None:
+        if cls not in self.keys:
+            self.keys[cls] = [
+                (field.name, ("" if i == 0 else ", ") + encode_basestring_ascii(field.name) + ": ")
+                for (i, field) in enumerate(dataclasses.fields(cls))
+            ] if dataclasses.is_dataclass(cls) else None
+        return self.keys[cls]
+
+    def encode_flags(self, flags: PathFlagsDto) -> str:
+        encoded = self.flags.get(flags)
+        if encoded is None:
+            encoded = self.flags[flags] = "{" + "".join(
+                key + encode_scalar(getattr(flags, name)) for (name, key) in self.fields(PathFlagsDto)
+            ) + "}"
+        return encoded
+
+    def encode(self, value):
+        chunks = self.chunks
+        cls = type(value)
+        if cls is SegmentBezierDto:
+            chunks.append(
+                '{"control1": ' + encode_point(value.control1) + ', "control2": ' + encode_point(value.control2)
+                + ', "end": ' + encode_point(value.end) + "}"
+            )
+        elif cls is SegmentLineDto:
+            chunks.append('{"end": ' + encode_point(value.end) + "}")
+        elif cls is PointDto:
+            chunks.append(encode_point(value))
+        elif cls is PathDto and all(type(outline.segments) in SEGMENT_FORMATS for outline in value.outlines):
+            chunks.append(
+                '{"flags": ' + self.encode_flags(value.flags) + ', "start": ' + encode_point(value.start)
+                + ', "outlines": [' + ", ".join(map(encode_outline, value.outlines)) + "]}"
+            )
+            if len(chunks) >= self.buffer_size:
+                self.flush()
+        elif (cls is OutlineLineDto or cls is OutlineBezierDto) and type(value.segments) in SEGMENT_FORMATS:
+            chunks.append(encode_outline(value))
+            if len(chunks) >= self.buffer_size:
+                self.flush()
+        elif cls in SEGMENT_FORMATS:
+            chunks.append(encode_segments(value))
+            if len(chunks) >= self.buffer_size:
+                self.flush()
+        elif cls is PathFlagsDto:
+            chunks.append(self.encode_flags(value))
+        elif cls is list or cls is tuple:
+            chunks.append("[")
+            for (i, item) in enumerate(value):
+                if i > 0:
+                    chunks.append(", ")
+                self.encode(item)
+                if len(chunks) >= self.buffer_size:
+                    self.flush()
+            chunks.append("]")
+        elif (keys := self.fields(cls)) is not None:
+            chunks.append("{")
+            for (name, key) in keys:
+                chunks.append(key)
+                self.encode(getattr(value, name))
+            chunks.append("}")
+        else:
+            chunks.append(encode_scalar(value))
+
+    def flush(self):
+        self.writer.write("".join(self.chunks))
+        self.chunks.clear()
+
+    def write(self, value):
+        self.encode(value)
+        self.flush()
+
+
+def dump(value, writer: TextIO):
+    JsonWriter(writer).write(value)
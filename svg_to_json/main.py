@@ -1,148 +1,185 @@
 #!/usr/bin/env python3
+import argparse
 import base64
-import dataclasses
-import json
-import math
-import sys
+import gc
+import logging
+import os
 import xml.dom.minidom
-from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import cycle, repeat
+from typing import Iterable, NamedTuple, Sequence
 
-from contours import list_window, Contour
+from contours import Bounds
 from draw_command import DrawCommandType
+from flatten import flatten_paths
 from fcm import PathDto, PointDto, OutlineBezierDto, SegmentBezierDto, OutlineLineDto, SegmentLineDto, \
-    PathFlagsDto, PieceDto, PieceFlagsDto, FileDto, CutDataDto, ThumbnailDto, OutlineTypeDto
+    PathFlagsDto, PieceDto, PieceFlagsDto, FileDto, CutDataDto, ThumbnailDto, OutlineDto, BezierSegments, \
+    LineSegments
+from json_writer import dump
+from ordering import improve_order, order_greedy, travel_length
 from path import Path
-from svg import find_elements
-
-
-class CustomJsonEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            return dataclasses.asdict(o)
-        if isinstance(o, bytes):
-            return b64encode(o).decode()
-        return super().default(o)
+from pieces import PieceMode, PieceSource, path_data, split_pieces
+from simplify import simplify_paths
+from svg import PathData, iter_paths
 
 
 def point_to_fcm(x: float, y: float) -> PointDto:
     return PointDto(int(round(x * 100)), int(round(y * 100)))
 
 
+def scale_values(values: Sequence[float], offset: int) -> list[int]:
+    return [round(value * 100) - offset for value in values]
+
+
+def fcm_coordinates(arguments: Sequence[float], size: int, offset: PointDto) -> list[int]:
+    if len(arguments) % size != 0:
+        arguments = arguments[:len(arguments) // size * size]
+    return [round(value * 100) - shift for (value, shift) in zip(arguments, cycle((offset.x, offset.y)))]
+
+
+def interleave(*columns: list[int]) -> list[int]:
+    values = [0] * (len(columns) * len(columns[0]))
+    for (i, column) in enumerate(columns):
+        values[i::len(columns)] = column
+    return values
+
+
+def reflected_controls(control1: PointDto, c2xs: list[int], c2ys: list[int], xs: list[int], ys: list[int]):
+    c1xs = [control1.x] + [2 * x - c2x for (x, c2x) in zip(xs[:-1], c2xs)]
+    c1ys = [control1.y] + [2 * y - c2y for (y, c2y) in zip(ys[:-1], c2ys)]
+    return c1xs, c1ys
+
+
+def quadratic_segments(last: PointDto, c1xs, c1ys, c2xs, c2ys, xs, ys) -> BezierSegments:
+    if len(xs) == 0:
+        return BezierSegments(())
+    lxs = [last.x] + xs[:-1]
+    lys = [last.y] + ys[:-1]
+    return BezierSegments(interleave(
+        [lx + round((c1x - lx) * (2/3)) for (lx, c1x) in zip(lxs, c1xs)],
+        [ly + round((c1y - ly) * (2/3)) for (ly, c1y) in zip(lys, c1ys)],
+        [c2x + round((c2x - c1x) * (2/3)) for (c2x, c1x) in zip(c2xs, c1xs)],
+        [c2y + round((c2y - c1y) * (2/3)) for (c2y, c1y) in zip(c2ys, c1ys)],
+        xs,
+        ys,
+    ))
+
+
+def end_of(outline: OutlineDto) -> PointDto:
+    coordinates = outline.segments.coordinates
+    return PointDto(coordinates[-2], coordinates[-1])
+
+
+def reflection_of(outlines: list[OutlineDto]) -> PointDto:
+    if len(outlines) == 0:
+        raise Exception("can't be first")
+    segments = outlines[-1].segments
+    coordinates = segments.coordinates
+    if isinstance(segments, BezierSegments):
+        return PointDto(2 * coordinates[-2] - coordinates[-4], 2 * coordinates[-1] - coordinates[-3])
+    elif isinstance(segments, LineSegments):
+        return PointDto(coordinates[-2], coordinates[-1])
+    else:
+        raise Exception("unknown segment type")
+
+
+def last_point(outlines: list[OutlineDto], start: PointDto | None) -> PointDto:
+    return start if len(outlines) == 0 else end_of(outlines[-1])
+
+
+def line_outlines(arguments: Sequence[float], offset: PointDto, outlines: list[OutlineDto], start: PointDto | None):
+    values = fcm_coordinates(arguments, 2, offset)
+    if len(values) > 0:
+        outlines.append(OutlineLineDto(LineSegments(values)))
+
+
+def bezier_outlines(arguments: Sequence[float], offset: PointDto, outlines: list[OutlineDto], start: PointDto | None):
+    values = fcm_coordinates(arguments, 6, offset)
+    if len(values) > 0:
+        outlines.append(OutlineBezierDto(BezierSegments(values)))
+
+
+def symmetric_bezier_outlines(
+        arguments: Sequence[float],
+        offset: PointDto,
+        outlines: list[OutlineDto],
+        start: PointDto | None,
+):
+    control1 = reflection_of(outlines)
+    values = fcm_coordinates(arguments, 4, offset)
+    if len(values) > 0:
+        c2xs, c2ys, xs, ys = (values[i::4] for i in range(4))
+        c1xs, c1ys = reflected_controls(control1, c2xs, c2ys, xs, ys)
+        outlines.append(OutlineBezierDto(BezierSegments(interleave(c1xs, c1ys, c2xs, c2ys, xs, ys))))
+
+
+def quadratic_outlines(arguments: Sequence[float], offset: PointDto, outlines: list[OutlineDto], start: PointDto | None):
+    last = last_point(outlines, start)
+    values = fcm_coordinates(arguments, 6, offset)
+    if len(values) > 0:
+        outlines.append(OutlineBezierDto(quadratic_segments(last, *(values[i::6] for i in range(6)))))
+
+
+def symmetric_quadratic_outlines(
+        arguments: Sequence[float],
+        offset: PointDto,
+        outlines: list[OutlineDto],
+        start: PointDto | None,
+):
+    last = last_point(outlines, start)
+    control1 = reflection_of(outlines)
+    values = fcm_coordinates(arguments, 4, offset)
+    if len(values) > 0:
+        c2xs, c2ys, xs, ys = (values[i::4] for i in range(4))
+        controls = reflected_controls(control1, c2xs, c2ys, xs, ys)
+        outlines.append(OutlineBezierDto(quadratic_segments(last, *controls, c2xs, c2ys, xs, ys)))
+
+
+def horizontal_outlines(arguments: Sequence[float], offset: PointDto, outlines: list[OutlineDto], start: PointDto | None):
+    if len(arguments) > 0:
+        last = last_point(outlines, start)
+        xs = scale_values(arguments, offset.x)
+        outlines.append(OutlineLineDto(LineSegments(interleave(xs, [last.y] * len(xs)))))
+
+
+def vertical_outlines(arguments: Sequence[float], offset: PointDto, outlines: list[OutlineDto], start: PointDto | None):
+    if len(arguments) > 0:
+        last = last_point(outlines, start)
+        ys = scale_values(arguments, offset.y)
+        outlines.append(OutlineLineDto(LineSegments(interleave([last.x] * len(ys), ys))))
+
+
+OUTLINE_CONVERTERS = {
+    DrawCommandType.LINE: line_outlines,
+    DrawCommandType.BEZIER: bezier_outlines,
+    DrawCommandType.BEZIER_SYMMETRIC: symmetric_bezier_outlines,
+    DrawCommandType.QUADRATIC: quadratic_outlines,
+    DrawCommandType.QUADRATIC_SYMMETRIC: symmetric_quadratic_outlines,
+    DrawCommandType.HORIZONTAL_LINE: horizontal_outlines,
+    DrawCommandType.VERTICAL_LINE: vertical_outlines,
+}
+
+
 def path_to_fcm(path: Path, offset: PointDto = PointDto(0, 0)) -> list[PathDto]:
     paths = []
     outlines = []
     start: PointDto | None = None
 
-    for i in range(0, len(path.commands)):
-        command = path.commands[i]
-        if command.type == DrawCommandType.QUADRATIC:
-            if len(outlines) == 0:
-                last = start
-            else:
-                last = outlines[-1].segments[-1].end
-            segments = []
-            for (c1x, c1y, c2x, c2y, x, y) in list_window(command.arguments, 6):
-                control1 = point_to_fcm(c1x, c1y) - offset
-                control2 = point_to_fcm(c2x, c2y) - offset
-                end = point_to_fcm(x, y) - offset
-                segments.append(SegmentBezierDto(
-                    last + (control1 - last) * (2/3),
-                    control2 + (control2 - control1) * (2/3),
-                    end
-                ))
-                last = end
-            if len(segments) > 0:
-                outlines.append(OutlineBezierDto(segments))
-        elif command.type == DrawCommandType.QUADRATIC_SYMMETRIC:
-            if len(outlines) == 0:
-                last = start
-            else:
-                last = outlines[-1].segments[-1].end
-            if len(outlines) == 0:
-                raise Exception("can't be first")
-            last_outline = outlines[-1]
-            last_segment = last_outline.segments[-1]
-            if isinstance(last_segment, SegmentBezierDto):
-                diff = last_segment.end - last_segment.control2
-                control1 = last_segment.end + diff
-            elif isinstance(last_segment, SegmentLineDto):
-                control1 = last_segment.end
-            else:
-                raise Exception("unknown segment type")
-            segments = []
-            for (c2x, c2y, x, y) in list_window(command.arguments, 4):
-                control2 = point_to_fcm(c2x, c2y) - offset
-                end = point_to_fcm(x, y) - offset
-                segments.append(SegmentBezierDto(
-                    last + (control1 - last) * (2/3),
-                    control2 + (control2 - control1) * (2/3),
-                    end
-                ))
-                last = end
-                diff = end - control2
-                control1 = end + diff
-            if len(segments) > 0:
-                outlines.append(OutlineBezierDto(segments))
-        elif command.type == DrawCommandType.BEZIER:
-            segments = [SegmentBezierDto(
-                point_to_fcm(c1x, c1y) - offset, point_to_fcm(c2x, c2y) - offset, point_to_fcm(x, y) - offset
-            ) for (c1x, c1y, c2x, c2y, x, y) in list_window(command.arguments, 6)]
-            if len(segments) > 0:
-                outlines.append(OutlineBezierDto(segments))
-        elif command.type == DrawCommandType.BEZIER_SYMMETRIC:
-            if len(outlines) == 0:
-                raise Exception("can't be first")
-            last_outline = outlines[-1]
-            last_segment = last_outline.segments[-1]
-            if isinstance(last_segment, SegmentBezierDto):
-                diff = last_segment.end - last_segment.control2
-                control1 = last_segment.end + diff
-            elif isinstance(last_segment, SegmentLineDto):
-                control1 = last_segment.end
-            else:
-                raise Exception("unknown segment type")
-            segments = []
-            for (c2x, c2y, x, y) in list_window(command.arguments, 4):
-                control2 = point_to_fcm(c2x, c2y) - offset
-                end = point_to_fcm(x, y) - offset
-                segments.append(SegmentBezierDto(
-                    control1, control2, end
-                ))
-                diff = end - control2
-                control1 = end + diff
-            if len(segments) > 0:
-                outlines.append(OutlineBezierDto(segments))
-        elif command.type == DrawCommandType.VERTICAL_LINE:
-            if len(outlines) == 0:
-                last = start
-            else:
-                last = outlines[-1].segments[-1].end
-            segments = [SegmentLineDto(PointDto(last.x, int(round(y * 100)) - offset.y)) for y in command.arguments]
-            if len(segments) > 0:
-                outlines.append(OutlineLineDto(segments))
-        elif command.type == DrawCommandType.HORIZONTAL_LINE:
-            if len(outlines) == 0:
-                last = start
-            else:
-                last = outlines[-1].segments[-1].end
-            segments = [SegmentLineDto(PointDto(int(round(x * 100)) - offset.x, last.y)) for x in command.arguments]
-            if len(segments) > 0:
-                outlines.append(OutlineLineDto(segments))
-        elif command.type == DrawCommandType.LINE:
-            segments = [SegmentLineDto(point_to_fcm(x, y) - offset) for (x, y) in list_window(command.arguments, 2)]
-            if len(segments) > 0:
-                outlines.append(OutlineLineDto(segments))
+    for command in path.commands:
+        convert = OUTLINE_CONVERTERS.get(command.type)
+        if convert is not None:
+            convert(command.arguments, offset, outlines, start)
         elif command.type == DrawCommandType.MOVE:
             if len(outlines) != 0 and start is not None:
                 paths.append(PathDto(PathFlagsDto(open=True, tool_cut=True), start - offset, outlines))
             start = point_to_fcm(command.arguments[0], command.arguments[1])
             outlines = []
-            segments = [SegmentLineDto(point_to_fcm(x, y) - offset) for (x, y) in list_window(command.arguments[2:], 2)]
-            if len(segments) > 0:
-                outlines.append(OutlineLineDto(segments))
+            line_outlines(command.arguments[2:], offset, outlines, start)
         elif command.type == DrawCommandType.CLOSE:
             if len(outlines) != 0 and start is not None:
-                outlines.append(OutlineLineDto([SegmentLineDto(start - offset)]))
+                end = start - offset
+                outlines.append(OutlineLineDto(LineSegments((end.x, end.y))))
                 paths.append(PathDto(PathFlagsDto(open=False, tool_cut=True), start - offset, outlines))
             start = None
             outlines = []
@@ -152,14 +189,48 @@ def path_to_fcm(path: Path, offset: PointDto = PointDto(0, 0)) -> list[PathDto]:
         paths.append(PathDto(PathFlagsDto(open=True, tool_cut=True), start - offset, outlines))
     return paths
 
-def piece_to_fcm(piece: xml.dom.minidom.Node, label: str = "") -> PieceDto:
-    paths = find_elements(piece, tag_name="path")
-    paths = [Path.of(path.getAttribute("d")) for path in paths]
-    contours = [contour for path in paths for contour in Contour.of(path)]
-    min_x = min(contour.min_x() for contour in contours)
-    min_y = min(contour.min_y() for contour in contours)
-    max_y = max(contour.max_y() for contour in contours)
-    max_x = max(contour.max_x() for contour in contours)
+
+class ConversionParameters(NamedTuple):
+    optimize: float = 0
+    simplify: float = 0
+    fit_curves: bool = True
+
+
+def piece_to_fcm(
+        piece: xml.dom.minidom.Node,
+        label: str = "",
+        parameters: ConversionParameters = ConversionParameters(),
+) -> PieceDto:
+    return data_to_piece(path_data(piece), label, parameters)
+
+
+@contextmanager
+def collector_paused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def data_to_piece(
+        data: list[str | Path],
+        label: str = "",
+        parameters: ConversionParameters = ConversionParameters(),
+) -> PieceDto:
+    with collector_paused():
+        return build_piece(data, label, parameters)
+
+
+def build_piece(data: list[str | Path], label: str, parameters: ConversionParameters) -> PieceDto:
+    paths = [Path.of(d) for d in data]
+    bounds = [bounds for path in paths if (bounds := Bounds.of(path)) is not None]
+    min_x = min(bound.min_x for bound in bounds)
+    min_y = min(bound.min_y for bound in bounds)
+    max_y = max(bound.max_y for bound in bounds)
+    max_x = max(bound.max_x for bound in bounds)
     top_left = point_to_fcm(min_x, min_y)
     bottom_right = point_to_fcm(max_x, max_y)
     size = bottom_right - top_left
@@ -168,19 +239,56 @@ def piece_to_fcm(piece: xml.dom.minidom.Node, label: str = "") -> PieceDto:
         (top_left.y + bottom_right.y) // 2,
     )
     paths = [fcm_path for path in paths for fcm_path in path_to_fcm(path, center)]
-    paths.sort(key=lambda path: path.start.y)
-    sorted_paths = [paths[0]]
-    paths = paths[1:]
-    while len(paths) > 0:
-        last = sorted_paths[-1].outlines[-1].segments[-1].end
-        p = min(paths, key=lambda el: math.sqrt(math.pow(last.x - el.start.x, 2) + math.pow((last.y - el.start.y) * 10, 2)))
-        paths.remove(p)
-        sorted_paths.append(p)
+    if parameters.simplify > 0:
+        paths, before, after = simplify_paths(paths, parameters.simplify, parameters.fit_curves)
+        logging.info("segments {0} -> {1} ({2:.1%} fewer)".format(
+            before, after, 1 - after / before if before else 0.0
+        ))
+    sorted_paths = order_greedy(paths)
+    if parameters.optimize > 0:
+        before = travel_length(sorted_paths)
+        sorted_paths = improve_order(sorted_paths, parameters.optimize)
+        after = travel_length(sorted_paths)
+        logging.info("travel {0:.0f} -> {1:.0f} ({2:.1%} shorter)".format(
+            before, after, 1 - after / before if before else 0.0
+        ))
     return PieceDto(size.x, size.y, 0, 0, (1.0, 0.0, 0.0, 1.0, float(center.x), float(center.y)), PieceFlagsDto(seam_allowance_locked=True), label, sorted_paths)
 
 
-def extract_paths(filename: str) -> FileDto:
-    dom = xml.dom.minidom.parse(filename)
+def convert_pieces(
+        sources: list[PieceSource],
+        parameters: ConversionParameters = ConversionParameters(),
+        workers: int | None = None,
+) -> list[PieceDto]:
+    labels = [source.label for source in sources]
+    data = [source.data for source in sources]
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    if workers < 2:
+        return list(map(data_to_piece, data, labels, repeat(parameters)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=gc.enable) as executor:
+        return list(executor.map(data_to_piece, data, labels, repeat(parameters)))
+
+
+def extract_paths(
+        filename: str,
+        parameters: ConversionParameters = ConversionParameters(),
+        mode: PieceMode = PieceMode.DOCUMENT,
+        prefix: str = "",
+        workers: int | None = None,
+        flatten: bool = False,
+) -> FileDto:
+    paths = flatten_paths(filename) if flatten else iter_paths(filename)
+    return convert_paths(paths, parameters, mode, prefix, workers)
+
+
+def convert_paths(
+        paths: Iterable[PathData],
+        parameters: ConversionParameters = ConversionParameters(),
+        mode: PieceMode = PieceMode.DOCUMENT,
+        prefix: str = "",
+        workers: int | None = None,
+) -> FileDto:
+    pieces = convert_pieces(split_pieces(paths, mode, prefix), parameters, workers)
     return FileDto(
         content_id=400000002,
         short_name="",
@@ -199,15 +307,26 @@ def extract_paths(filename: str) -> FileDto:
             data=base64.decodebytes(
                 b"Qk1eBAAAAAAAAD4AAAAoAAAAWAAAAFgAAAABAAEAAAAAAAAAAAAlFgAAJRYAAAIAAAACAAAAAAAA/////////////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wD//////////////wA=")
         ),
-        pieces=[
-            piece_to_fcm(dom, ""),
-        ],
+        pieces=pieces,
     )
 
 
 if __name__ == "__main__":
-    args = sys.argv[1:]
-    if len(args) == 2:
-        converted = extract_paths(args[0])
-        with open(args[1], "w") as out:
-            json.dump(converted, out, cls=CustomJsonEncoder)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--optimize", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--simplify", type=float, default=0, metavar="TOLERANCE")
+    parser.add_argument("--no-curve-fit", action="store_true")
+    parser.add_argument("--pieces", type=PieceMode, choices=list(PieceMode), default=PieceMode.DOCUMENT)
+    parser.add_argument("--id-prefix", default="piece")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--flatten", action="store_true")
+    args = parser.parse_args()
+    parameters = ConversionParameters(args.optimize, args.simplify, not args.no_curve_fit)
+    with collector_paused():
+        converted = extract_paths(args.input, parameters, args.pieces, args.id_prefix, args.workers, args.flatten)
+        with open(args.output, "w") as out:
+            dump(converted, out)
+        del converted
@@ -0,0 +1,171 @@
+import heapq
+import math
+import time
+from typing import Iterable
+
+from fcm import PathDto, PointDto
+
+Y_WEIGHT = 10
+
+
+def scaled(point: PointDto) -> tuple[int, int]:
+    return point.x, point.y * Y_WEIGHT
+
+
+def path_end(path: PathDto) -> PointDto:
+    return path.outlines[-1].segments[-1].end
+
+
+def travel(end: PointDto, start: PointDto) -> float:
+    return math.sqrt(math.pow(end.x - start.x, 2) + math.pow((end.y - start.y) * Y_WEIGHT, 2))
+
+
+def travel_length(paths: list[PathDto]) -> float:
+    return sum(travel(path_end(previous), path.start) for (previous, path) in zip(paths, paths[1:]))
+
+
+class PointGrid:
+    def __init__(self, points: list[tuple[int, int]], indices: Iterable[int]):
+        self.points = points
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        indices = list(indices)
+        self.size = len(indices)
+        self.built = self.size
+        if self.size == 0:
+            self.cell, self.min_x, self.min_y, self.columns, self.rows = 1, 0, 0, 1, 1
+            return
+        xs = [points[i][0] for i in indices]
+        ys = [points[i][1] for i in indices]
+        self.min_x, self.min_y = min(xs), min(ys)
+        width, height = max(xs) - self.min_x, max(ys) - self.min_y
+        self.cell = max(1, math.ceil(max(math.sqrt(width * height / self.size), max(width, height) / self.size)))
+        self.columns = width // self.cell + 1
+        self.rows = height // self.cell + 1
+        for i in indices:
+            self.cells.setdefault(self.cell_of(points[i]), []).append(i)
+
+    def cell_of(self, point: tuple[int, int]) -> tuple[int, int]:
+        return (point[0] - self.min_x) // self.cell, (point[1] - self.min_y) // self.cell
+
+    def indices(self) -> list[int]:
+        return [i for cell in self.cells.values() for i in cell]
+
+    def remove(self, index: int):
+        cell = self.cell_of(self.points[index])
+        members = self.cells[cell]
+        members.remove(index)
+        if len(members) == 0:
+            del self.cells[cell]
+        self.size -= 1
+
+    def ring(self, cx: int, cy: int, r: int) -> Iterable[tuple[int, int]]:
+        if r == 0:
+            yield cx, cy
+            return
+        x_range = range(max(cx - r, 0), min(cx + r, self.columns - 1) + 1)
+        for y in (cy - r, cy + r):
+            if 0 <= y < self.rows:
+                for x in x_range:
+                    yield x, y
+        y_range = range(max(cy - r + 1, 0), min(cy + r - 1, self.rows - 1) + 1)
+        for x in (cx - r, cx + r):
+            if 0 <= x < self.columns:
+                for y in y_range:
+                    yield x, y
+
+    def search(self, point: tuple[int, int], k: int = 1) -> list[tuple[int, int]]:
+        px, py = point
+        cx, cy = self.cell_of(point)
+        reach = max(cx, self.columns - 1 - cx, cy, self.rows - 1 - cy)
+        found: list[tuple[int, int]] = []
+        for r in range(0, reach + 1):
+            for cell in self.ring(cx, cy, r):
+                for i in self.cells.get(cell, ()):
+                    x, y = self.points[i]
+                    candidate = (-((px - x) ** 2 + (py - y) ** 2), -i)
+                    if len(found) < k:
+                        heapq.heappush(found, candidate)
+                    elif candidate > found[0]:
+                        heapq.heapreplace(found, candidate)
+            if len(found) == k and -found[0][0] <= (r * self.cell) ** 2:
+                break
+        return sorted((-distance, -i) for (distance, i) in found)
+
+
+def order_greedy(paths: list[PathDto]) -> list[PathDto]:
+    if len(paths) == 0:
+        return []
+    paths = sorted(paths, key=lambda path: path.start.y)
+    starts = [scaled(path.start) for path in paths]
+    grid = PointGrid(starts, range(1, len(paths)))
+    order = [0]
+    while grid.size > 0:
+        _, index = grid.search(scaled(path_end(paths[order[-1]])))[0]
+        grid.remove(index)
+        order.append(index)
+        if grid.size > 64 and grid.size * 4 < grid.built:
+            grid = PointGrid(starts, grid.indices())
+    return [paths[i] for i in order]
+
+
+def improve_order(paths: list[PathDto], budget: float, neighbours: int = 8) -> list[PathDto]:
+    deadline = time.perf_counter() + budget
+    count = len(paths)
+    if count < 3:
+        return paths
+    starts = [path.start for path in paths]
+    ends = [path_end(path) for path in paths]
+    grid = PointGrid([scaled(end) for end in ends], range(count))
+    candidates = [
+        [j for (_, j) in grid.search(scaled(starts[i]), neighbours + 1) if j != i]
+        for i in range(count)
+    ]
+    following = list(range(1, count)) + [-1]
+    preceding = [-1] + list(range(0, count - 1))
+
+    def cost(a: int, b: int) -> float:
+        if a == -1 or b == -1:
+            return 0.0
+        return travel(ends[a], starts[b])
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for first in range(1, count):
+            if time.perf_counter() >= deadline:
+                break
+            last = first
+            chain = [first]
+            for _ in range(3):
+                before, after = preceding[first], following[last]
+                removed = cost(before, first) + cost(last, after) - cost(before, after)
+                for j in candidates[first]:
+                    if j == before or j in chain:
+                        continue
+                    successor = following[j]
+                    added = cost(j, first) + cost(last, successor) - cost(j, successor)
+                    if added < removed - 1e-9:
+                        following[before] = after
+                        if after != -1:
+                            preceding[after] = before
+                        following[j] = first
+                        preceding[first] = j
+                        following[last] = successor
+                        if successor != -1:
+                            preceding[successor] = last
+                        improved = True
+                        break
+                else:
+                    if following[last] == -1:
+                        break
+                    last = following[last]
+                    chain.append(last)
+                    continue
+                break
+
+    order = []
+    node = 0
+    while node != -1:
+        order.append(paths[node])
+        node = following[node]
+    return order
@@ -1,7 +1,13 @@
+import re
 from typing import NamedTuple
 
 from draw_command import DrawCommand, DrawCommandType
 
+LETTERS = "".join(command.value + command.value.lower() for command in DrawCommandType)
+COMMANDS = re.compile("([{0}])([^{0}]*)".format(LETTERS))
+PLAIN_DATA = re.compile(r"[\d\s,.eE+{0}-]*".format(LETTERS))
+
+
 class Path(NamedTuple):
     commands: list[DrawCommand]
 
@@ -9,17 +15,8 @@ class Path(NamedTuple):
         return " ".join(command.to_string() for command in self.commands)
 
     @staticmethod
-    def of(data: str):
-        commands = []
-        last_index = 0
-        index = 0
-        while index < len(data):
-            char = data[index]
-            if DrawCommandType.has(char.upper()):
-                if last_index < index:
-                    commands.append(DrawCommand.of(data[last_index], data[last_index + 1:index]))
-                last_index = index
-            index += 1
-        if last_index < index:
-            commands.append(DrawCommand.of(data[last_index], data[last_index + 1:index]))
-        return Path(commands)
+    def of(data: "str | Path"):
+        if isinstance(data, Path):
+            return data
+        plain = PLAIN_DATA.fullmatch(data) is not None
+        return Path([DrawCommand.of(command, arguments, plain) for (command, arguments) in COMMANDS.findall(data)])
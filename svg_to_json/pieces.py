@@ -0,0 +1,101 @@
+import enum
+from typing import Iterable, NamedTuple
+from xml.dom.minidom import Node
+
+from contours import Bounds
+from path import Path
+from svg import PathData, find_elements
+
+
+class PieceMode(enum.StrEnum):
+    DOCUMENT = "document"
+    GROUP = "group"
+    ID = "id"
+    OUTLINE = "outline"
+
+
+class PieceSource(NamedTuple):
+    label: str
+    data: list[str | Path]
+
+
+def path_data(node: Node) -> list[str]:
+    return [path.getAttribute("d") for path in find_elements(node, tag_name="path")]
+
+
+def document_pieces(paths: Iterable[PathData]) -> list[PieceSource]:
+    return [PieceSource("", [path.data for path in paths])]
+
+
+def keyed_pieces(paths: Iterable[PathData], key) -> list[PieceSource]:
+    pieces: dict[object, PieceSource] = {}
+    for path in paths:
+        (identity, label) = key(path)
+        piece = pieces.get(identity)
+        if piece is None:
+            piece = pieces[identity] = PieceSource(label, [])
+        piece.data.append(path.data)
+    return list(pieces.values())
+
+
+def group_pieces(paths: Iterable[PathData]) -> list[PieceSource]:
+    def key(path: PathData):
+        if path.scopes[1].tag == "g":
+            return path.scopes[1].index, path.scopes[1].id
+        return None, ""
+
+    return keyed_pieces((path for path in paths if len(path.scopes) > 1), key)
+
+
+def id_pieces(paths: Iterable[PathData], prefix: str) -> list[PieceSource]:
+    def key(path: PathData):
+        for scope in path.scopes:
+            if scope.id.startswith(prefix):
+                return scope.index, scope.id
+        return None, ""
+
+    return keyed_pieces(paths, key)
+
+
+def path_bounds(data: str | Path) -> Bounds | None:
+    return Bounds.of(Path.of(data))
+
+
+def overlapping_groups(boxes: list[Bounds]) -> list[list[int]]:
+    parent = list(range(len(boxes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    active: list[int] = []
+    for i in sorted(range(len(boxes)), key=lambda i: boxes[i].min_x):
+        box = boxes[i]
+        active = [j for j in active if boxes[j].max_x >= box.min_x]
+        for j in active:
+            if boxes[j].min_y <= box.max_y and box.min_y <= boxes[j].max_y:
+                parent[find(i)] = find(j)
+        active.append(i)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(boxes)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def outline_pieces(paths: Iterable[PathData]) -> list[PieceSource]:
+    data = [(path.data, bounds) for path in paths if (bounds := path_bounds(path.data)) is not None]
+    groups = overlapping_groups([bounds for (_, bounds) in data])
+    return [PieceSource("", [data[i][0] for i in group]) for group in groups]
+
+
+def split_pieces(paths: Iterable[PathData], mode: PieceMode = PieceMode.DOCUMENT, prefix: str = "") -> list[PieceSource]:
+    if mode == PieceMode.GROUP:
+        return group_pieces(paths)
+    elif mode == PieceMode.ID:
+        return id_pieces(paths, prefix)
+    elif mode == PieceMode.OUTLINE:
+        return outline_pieces(paths)
+    return document_pieces(paths)
@@ -0,0 +1,304 @@
+import math
+from typing import NamedTuple
+
+from fcm import BezierSegments, LineSegments, OutlineBezierDto, OutlineDto, OutlineLineDto, PathDto, \
+    SegmentBezierDto
+
+ROUNDING = math.sqrt(2) / 2
+
+Point = tuple[float, float]
+Cubic = tuple[Point, Point, Point]
+
+
+class SimplifyResult(NamedTuple):
+    paths: list[PathDto]
+    segments_before: int
+    segments_after: int
+
+
+def subtract(a: Point, b: Point) -> Point:
+    return a[0] - b[0], a[1] - b[1]
+
+
+def dot(a: Point, b: Point) -> float:
+    return a[0] * b[0] + a[1] * b[1]
+
+
+def cross(a: Point, b: Point) -> float:
+    return a[0] * b[1] - a[1] * b[0]
+
+
+def normalize(vector: Point) -> Point:
+    length = math.hypot(*vector)
+    if length == 0:
+        return 0.0, 0.0
+    return vector[0] / length, vector[1] / length
+
+
+def segment_distance(point: Point, a: Point, b: Point) -> float:
+    direction = subtract(b, a)
+    length = dot(direction, direction)
+    offset = subtract(point, a)
+    if length == 0:
+        return math.hypot(*offset)
+    t = min(1.0, max(0.0, dot(offset, direction) / length))
+    return math.hypot(offset[0] - t * direction[0], offset[1] - t * direction[1])
+
+
+def merge_collinear(points: list[Point]) -> list[Point]:
+    merged = [points[0]]
+    for point in points[1:]:
+        if point == merged[-1]:
+            continue
+        if len(merged) > 1:
+            incoming = subtract(merged[-1], merged[-2])
+            outgoing = subtract(point, merged[-1])
+            if cross(incoming, outgoing) == 0 and dot(incoming, outgoing) > 0:
+                merged[-1] = point
+                continue
+        merged.append(point)
+    return merged
+
+
+def douglas_peucker(points: list[Point], tolerance: float) -> list[Point]:
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while len(stack) > 0:
+        first, last = stack.pop()
+        farthest, distance = first, 0.0
+        for i in range(first + 1, last):
+            d = segment_distance(points[i], points[first], points[last])
+            if d > distance:
+                farthest, distance = i, d
+        if distance > tolerance:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for (point, kept) in zip(points, keep) if kept]
+
+
+def split_corners(points: list[Point], corner: float) -> list[list[Point]]:
+    runs = []
+    start = 0
+    for i in range(1, len(points) - 1):
+        incoming = normalize(subtract(points[i], points[i - 1]))
+        outgoing = normalize(subtract(points[i + 1], points[i]))
+        if dot(incoming, outgoing) < corner:
+            runs.append(points[start:i + 1])
+            start = i
+    runs.append(points[start:])
+    return runs
+
+
+def bezier(curve: tuple[Point, Point, Point, Point], t: float) -> Point:
+    p0, p1, p2, p3 = curve
+    s = 1 - t
+    b0, b1, b2, b3 = s * s * s, 3 * s * s * t, 3 * s * t * t, t * t * t
+    return (
+        b0 * p0[0] + b1 * p1[0] + b2 * p2[0] + b3 * p3[0],
+        b0 * p0[1] + b1 * p1[1] + b2 * p2[1] + b3 * p3[1],
+    )
+
+
+def bezier_derivatives(curve: tuple[Point, Point, Point, Point], t: float) -> tuple[Point, Point]:
+    p0, p1, p2, p3 = curve
+    s = 1 - t
+    d1 = tuple(3 * s * s * (p1[i] - p0[i]) + 6 * s * t * (p2[i] - p1[i]) + 3 * t * t * (p3[i] - p2[i]) for i in range(2))
+    d2 = tuple(6 * s * (p2[i] - 2 * p1[i] + p0[i]) + 6 * t * (p3[i] - 2 * p2[i] + p1[i]) for i in range(2))
+    return d1, d2
+
+
+def chord_parameters(points: list[Point]) -> list[float]:
+    lengths = [0.0]
+    for (a, b) in zip(points, points[1:]):
+        lengths.append(lengths[-1] + math.hypot(*subtract(b, a)))
+    total = lengths[-1] or 1.0
+    return [length / total for length in lengths]
+
+
+def generate_bezier(points: list[Point], parameters: list[float], left: Point, right: Point):
+    first, last = points[0], points[-1]
+    c00 = c01 = c11 = x0 = x1 = 0.0
+    for (point, t) in zip(points, parameters):
+        s = 1 - t
+        b0, b1, b2, b3 = s * s * s, 3 * s * s * t, 3 * s * t * t, t * t * t
+        a1 = (left[0] * b1, left[1] * b1)
+        a2 = (right[0] * b2, right[1] * b2)
+        c00 += dot(a1, a1)
+        c01 += dot(a1, a2)
+        c11 += dot(a2, a2)
+        rest = (
+            point[0] - (b0 + b1) * first[0] - (b2 + b3) * last[0],
+            point[1] - (b0 + b1) * first[1] - (b2 + b3) * last[1],
+        )
+        x0 += dot(a1, rest)
+        x1 += dot(a2, rest)
+    determinant = c00 * c11 - c01 * c01
+    chord = math.hypot(*subtract(last, first))
+    alpha_left = alpha_right = 0.0
+    if determinant != 0:
+        alpha_left = (x0 * c11 - x1 * c01) / determinant
+        alpha_right = (c00 * x1 - c01 * x0) / determinant
+    if alpha_left < 1e-6 * chord or alpha_right < 1e-6 * chord:
+        alpha_left = alpha_right = chord / 3
+    return (
+        first,
+        (first[0] + left[0] * alpha_left, first[1] + left[1] * alpha_left),
+        (last[0] + right[0] * alpha_right, last[1] + right[1] * alpha_right),
+        last,
+    )
+
+
+def max_error(points: list[Point], curve, parameters: list[float]) -> tuple[float, int]:
+    error, split = 0.0, len(points) // 2
+    for i in range(1, len(points)):
+        if i < len(points) - 1:
+            d = math.hypot(*subtract(bezier(curve, parameters[i]), points[i]))
+            if d > error:
+                error, split = d, i
+        middle = bezier(curve, (parameters[i - 1] + parameters[i]) / 2)
+        d = segment_distance(middle, points[i - 1], points[i])
+        if d > error:
+            error, split = d, min(max(i, 1), len(points) - 2)
+    return error, split
+
+
+def reparameterize(points: list[Point], curve, parameters: list[float]) -> list[float]:
+    result = []
+    for (point, t) in zip(points, parameters):
+        difference = subtract(bezier(curve, t), point)
+        d1, d2 = bezier_derivatives(curve, t)
+        denominator = dot(d1, d1) + dot(difference, d2)
+        result.append(t if denominator == 0 else min(1.0, max(0.0, t - dot(difference, d1) / denominator)))
+    return result
+
+
+def fit_cubics(points: list[Point], tolerance: float) -> list[Cubic]:
+    fitted = []
+    stack = [(
+        0, len(points) - 1,
+        normalize(subtract(points[1], points[0])),
+        normalize(subtract(points[-2], points[-1])),
+    )]
+    while len(stack) > 0:
+        first, last, left, right = stack.pop()
+        run = points[first:last + 1]
+        if len(run) == 2:
+            chord = subtract(run[1], run[0])
+            fitted.append((
+                (run[0][0] + chord[0] / 3, run[0][1] + chord[1] / 3),
+                (run[1][0] - chord[0] / 3, run[1][1] - chord[1] / 3),
+                run[1],
+            ))
+            continue
+        parameters = chord_parameters(run)
+        curve = generate_bezier(run, parameters, left, right)
+        error, split = max_error(run, curve, parameters)
+        if error > tolerance and error < tolerance * 4:
+            for _ in range(4):
+                candidate = reparameterize(run, curve, parameters)
+                if any(b <= a for (a, b) in zip(candidate, candidate[1:])):
+                    break
+                parameters = candidate
+                curve = generate_bezier(run, parameters, left, right)
+                error, split = max_error(run, curve, parameters)
+                if error <= tolerance:
+                    break
+        if error <= tolerance:
+            fitted.append(curve[1:])
+            continue
+        middle = first + split
+        center = normalize(subtract(points[middle - 1], points[middle + 1]))
+        if center == (0.0, 0.0):
+            center = normalize(subtract(points[middle - 1], points[middle]))
+        stack.append((middle, last, (-center[0], -center[1]), right))
+        stack.append((first, middle, left, center))
+    return fitted
+
+
+def flatness(start: Point, segment: SegmentBezierDto) -> float:
+    end = (segment.end.x, segment.end.y)
+    return max(segment_distance((control.x, control.y), start, end) for control in (segment.control1, segment.control2))
+
+
+def simplify_polyline(points: list[Point], tolerance: float, fit_curves: bool, corner: float) -> list:
+    points = merge_collinear(points)
+    if len(points) < 2:
+        return []
+    result = []
+    for run in split_corners(points, corner) if fit_curves else [points]:
+        lines = douglas_peucker(run, tolerance)
+        if fit_curves and tolerance > ROUNDING and len(lines) > 3:
+            cubics = fit_cubics(run, tolerance - ROUNDING)
+            if len(cubics) < len(lines) - 1:
+                result.extend(cubics)
+                continue
+        result.extend(lines[1:])
+    return result
+
+
+def rounded(point: Point) -> tuple[int, int]:
+    return round(point[0]), round(point[1])
+
+
+def build_outlines(elements: list) -> list[OutlineDto]:
+    outlines = []
+    lines: list[int] = []
+    curves: list[int] = []
+    for element in elements:
+        if isinstance(element[0], tuple):
+            if len(lines) > 0:
+                outlines.append(OutlineLineDto(LineSegments(lines)))
+                lines = []
+            for point in element:
+                curves.extend(rounded(point))
+        else:
+            if len(curves) > 0:
+                outlines.append(OutlineBezierDto(BezierSegments(curves)))
+                curves = []
+            lines.extend(rounded(element))
+    if len(lines) > 0:
+        outlines.append(OutlineLineDto(LineSegments(lines)))
+    if len(curves) > 0:
+        outlines.append(OutlineBezierDto(BezierSegments(curves)))
+    return outlines
+
+
+def simplify_path(path: PathDto, tolerance: float, fit_curves: bool, corner: float) -> PathDto:
+    elements = []
+    polyline = [(path.start.x, path.start.y)]
+    collapsed = 0.0
+    for outline in path.outlines:
+        for segment in outline.segments:
+            end = (segment.end.x, segment.end.y)
+            deviation = flatness(polyline[-1], segment) if isinstance(segment, SegmentBezierDto) else 0.0
+            if deviation > tolerance / 2:
+                elements.extend(simplify_polyline(polyline, tolerance - collapsed, fit_curves, corner))
+                elements.append((
+                    (segment.control1.x, segment.control1.y), (segment.control2.x, segment.control2.y), end,
+                ))
+                polyline = [end]
+                collapsed = 0.0
+            else:
+                polyline.append(end)
+                collapsed = max(collapsed, deviation)
+    elements.extend(simplify_polyline(polyline, tolerance - collapsed, fit_curves, corner))
+    outlines = build_outlines(elements)
+    if len(outlines) == 0:
+        return path
+    return PathDto(path.flags, path.start, outlines)
+
+
+def segment_count(paths: list[PathDto]) -> int:
+    return sum(len(outline.segments) for path in paths for outline in path.outlines)
+
+
+def simplify_paths(
+        paths: list[PathDto],
+        tolerance: float,
+        fit_curves: bool = True,
+        corner: float = math.cos(math.radians(30)),
+) -> SimplifyResult:
+    simplified = [simplify_path(path, tolerance, fit_curves, corner) for path in paths]
+    return SimplifyResult(simplified, segment_count(paths), segment_count(simplified))
@@ -1,13 +1,33 @@
-from typing import Iterator
+from typing import BinaryIO, Iterator, NamedTuple
 from xml.dom.minidom import Node, Element
+from xml.etree.ElementTree import iterparse
+
+from path import Path
+
+
+class Scope(NamedTuple):
+    tag: str
+    id: str
+    index: int
+
+
+class PathData(NamedTuple):
+    data: str | Path
+    scopes: tuple[Scope, ...]
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
 
 
 def find_elements(node: Node, tag_name: str | None = None) -> Iterator[Element]:
-    if isinstance(node, Element):
-        if tag_name is None or node.tagName == tag_name:
-            yield node
-    for child in node.childNodes:
-        yield from find_elements(child, tag_name)
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, Element):
+            if tag_name is None or node.tagName == tag_name:
+                yield node
+        stack.extend(reversed(node.childNodes))
 
 
 def find_element_by_id(node: Node, id: str, tag_name: str | None = None) -> Element | None:
@@ -15,3 +35,22 @@ def find_element_by_id(node: Node, id: str, tag_name: str | None = None) -> Elem
         if element.getAttribute("id") == id:
             return element
     return None
+
+
+def iter_paths(source: str | BinaryIO) -> Iterator[PathData]:
+    elements = []
+    scopes: list[Scope] = []
+    index = 0
+    for (event, element) in iterparse(source, events=("start", "end")):
+        if event == "start":
+            elements.append(element)
+            scopes.append(Scope(local_name(element.tag), element.get("id", ""), index))
+            index += 1
+            continue
+        if scopes[-1].tag == "path":
+            yield PathData(element.get("d", ""), tuple(scopes))
+        elements.pop()
+        scopes.pop()
+        element.clear()
+        if len(elements) > 0:
+            elements[-1].remove(element)
@@ -0,0 +1,27 @@
+from contours import Bounds
+from path import Path
+
+
+def bounds(data: str) -> Bounds | None:
+    return Bounds.of(Path.of(data))
+
+
+def test_absolute_and_relative_commands():
+    assert bounds("M 10 20 L 30 5 l 10 10") == Bounds(10, 5, 40, 20)
+    assert bounds("m 10 20 30 5 h -50 v 10") == Bounds(-10, 20, 40, 35)
+    assert bounds("M 10 20 H 0 V -5") == Bounds(0, -5, 10, 20)
+
+
+def test_curves_contribute_their_end_points():
+    assert bounds("M 0 0 C 100 100 -100 -100 10 10 Q 50 50 20 0 S 90 90 5 5 T 0 30") == Bounds(0, 0, 20, 30)
+    assert bounds("M 0 0 A 5 5 0 0 1 10 0 a 5 5 0 0 1 0 20") == Bounds(0, 0, 10, 20)
+
+
+def test_close_returns_to_the_subpath_start():
+    assert bounds("M 10 10 l 10 0 l 0 10 z l -20 -20") == Bounds(-10, -10, 20, 20)
+    assert bounds("M 0 0 L 5 5 Z M 100 100 z m 1 1 l 1 1") == Bounds(0, 0, 102, 102)
+
+
+def test_paths_without_points_have_no_bounds():
+    assert bounds("") is None
+    assert bounds("Z") is None
@@ -0,0 +1,34 @@
+from array import array
+
+import pytest
+
+from draw_command import NUMBERS, DrawCommand, DrawCommandType
+from path import Path
+
+
+def arguments(data: str) -> list[list[float]]:
+    return [list(command.arguments) for command in Path.of(data).commands]
+
+
+def test_numbers_without_separators():
+    assert arguments("M 1.5.5 L1-2 l.5-.5e1") == [[1.5, 0.5], [1, -2], [0.5, -5]]
+
+
+def test_exponents():
+    assert arguments("M 1e-3 2E+2 L 1e3-4e-1") == [[0.001, 200], [1000, -0.4]]
+
+
+def test_arc_flags_written_together():
+    assert arguments("M 0 0 a1 1 0 0110 10 A 2,2 0 1,0 5,5") == [[0, 0], [1, 1, 0, 0, 1, 10, 10], [2, 2, 0, 1, 0, 5, 5]]
+
+
+def test_commands_keep_their_case():
+    assert [(command.type, command.absolute) for command in Path.of("M 0 0 l 1 1 Z").commands] == [
+        (DrawCommandType.MOVE, True), (DrawCommandType.LINE, False), (DrawCommandType.CLOSE, True),
+    ]
+
+
+@pytest.mark.parametrize("data", ["1 2 3 4", " 1,2, 3 ,4 ", "1.5.5", "1-2", "-.5e-1.5", "1e3-4", "+1 -2", "", " "])
+@pytest.mark.parametrize("plain", [False, True])
+def test_plain_split_falls_back_to_the_tokenizer(data, plain):
+    assert DrawCommand.of("L", data, plain).arguments == array("d", map(float, NUMBERS.findall(data)))
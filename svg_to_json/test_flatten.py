@@ -0,0 +1,76 @@
+import io
+
+from fcm import OutlineTypeDto, PointDto
+from flatten import IDENTITY, flatten_path, flatten_paths, format_path, transform_paths
+from main import convert_paths, path_to_fcm
+from path import Path
+from svg import PathData, Scope
+
+
+def flattened(data: str) -> str:
+    return format_path(flatten_path(Path.of(data), IDENTITY))
+
+
+def outlines(data: str) -> list[tuple[OutlineTypeDto, list[int]]]:
+    return [
+        (outline.type, list(outline.segments.coordinates))
+        for path in path_to_fcm(Path.of(flattened(data)), PointDto(0, 0))
+        for outline in path.outlines
+    ]
+
+
+def test_quadratic_and_smooth_quadratic_become_cubics():
+    assert outlines("M 10 10 Q 50 50 90 10 T 170 10") == [
+        (OutlineTypeDto.BEZIER, [3667, 3667, 6333, 3667, 9000, 1000]),
+        (OutlineTypeDto.BEZIER, [11667, -1667, 14333, -1667, 17000, 1000]),
+    ]
+
+
+def test_closed_quadratic_keeps_its_curve():
+    assert outlines("M 10 100 Q 50 140 90 100 Z") == [
+        (OutlineTypeDto.BEZIER, [3667, 12667, 6333, 12667, 9000, 10000]),
+        (OutlineTypeDto.LINE, [1000, 10000]),
+    ]
+
+
+def test_relative_smooth_quadratic_chain():
+    assert outlines("m 0 0 q 10 10 20 0 t 20 0 t 20 0") == [
+        (OutlineTypeDto.BEZIER, [667, 667, 1333, 667, 2000, 0]),
+        (OutlineTypeDto.BEZIER, [2667, -667, 3333, -667, 4000, 0]),
+        (OutlineTypeDto.BEZIER, [4667, 667, 5333, 667, 6000, 0]),
+    ]
+
+
+def test_smooth_cubic_reflects_previous_control():
+    assert flattened("M 0 0 C 10 0 20 10 20 20 s 10 20 20 20") == (
+        "M 0.0 0.0 C 10.0 0.0 20.0 10.0 20.0 20.0 C 20.0 30.0 30.0 40.0 40.0 40.0"
+    )
+
+
+def test_smooth_curves_without_predecessor_use_current_point():
+    assert flattened("M 0 0 L 10 0 S 20 10 30 0") == "M 0.0 0.0 L 10.0 0.0 C 10.0 0.0 20.0 10.0 30.0 0.0"
+    assert flattened("M 0 0 T 30 0") == "M 0.0 0.0 C 0.0 0.0 10.0 0.0 30.0 0.0"
+
+
+def document(attributes: str, body: str) -> io.BytesIO:
+    return io.BytesIO('<svg xmlns="http://www.w3.org/2000/svg" {0}>{1}</svg>'.format(attributes, body).encode())
+
+
+def test_identity_document_gives_exact_numbers():
+    source = document('width="210mm" height="297mm" viewBox="0 0 210 297"', '<path d="M 10 10 L 20.5 30 H 40 V 50 Z"/>')
+    assert [path.data for path in flatten_paths(source)] == ["M 10.0 10.0 L 20.5 30.0 H 40.0 V 50.0 Z"]
+
+
+def test_scale_only_document_gives_exact_numbers():
+    source = document(
+        'width="105mm" height="148.5mm" viewBox="0 0 420 594"',
+        '<g transform="scale(2)"><path d="M 10 10 L 20.5 30"/></g>',
+    )
+    assert [path.data for path in flatten_paths(source)] == ["M 10.0 10.0 L 20.5 30.0"]
+
+
+def test_transformed_paths_convert_like_their_formatted_data():
+    paths = [PathData("M 10 10 h 5 q 5 5 10 0 a 5 5 0 0 1 10 0 z m 1 1 v 20", (Scope("path", "", 0),))]
+    matrix = (0.5, 0.1, -0.1, 0.5, 3.0, 4.0)
+    formatted = [PathData(format_path(path.data), path.scopes) for path in transform_paths(paths, matrix)]
+    assert convert_paths(transform_paths(paths, matrix)) == convert_paths(formatted)
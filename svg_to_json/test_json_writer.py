@@ -0,0 +1,67 @@
+import dataclasses
+import gc
+import io
+import json
+from base64 import b64encode
+
+import pytest
+
+from fcm import BezierSegments, LineSegments, OutlineBezierDto, OutlineLineDto, PackedSegments, PathDto, PathFlagsDto, \
+    PointDto
+from json_writer import dump
+from main import extract_paths
+from pieces import PieceMode
+
+DESIGN = """<svg xmlns="http://www.w3.org/2000/svg" width="210mm" height="297mm" viewBox="0 0 210 297">
+<g id="a"><path d="M 10 10 L 50 10 Q 60 30 50 50 T 30 70 Z"/><path d="M 5 5 l 10 0 c 5 5 10 5 15 0"/></g>
+<g id="b"><rect x="60" y="120" width="40" height="25" rx="4"/><circle cx="150" cy="80" r="20"/></g>
+</svg>
+"""
+
+
+class LegacyJsonEncoder(json.JSONEncoder):
+    def default(self, o):
+        if dataclasses.is_dataclass(o):
+            return dataclasses.asdict(o)
+        if isinstance(o, bytes):
+            return b64encode(o).decode()
+        return super().default(o)
+
+
+def legacy(value):
+    if isinstance(value, PackedSegments):
+        return [legacy(segment) for segment in value]
+    if dataclasses.is_dataclass(value):
+        return {field.name: legacy(getattr(value, field.name)) for field in dataclasses.fields(value)}
+    if isinstance(value, (list, tuple)):
+        return [legacy(item) for item in value]
+    return value
+
+
+def dumped(value) -> str:
+    out = io.StringIO()
+    dump(value, out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("mode", list(PieceMode))
+def test_converted_files_serialize_like_plain_dataclasses(tmp_path, mode):
+    source = tmp_path / "design.svg"
+    source.write_text(DESIGN)
+    converted = extract_paths(str(source), mode=mode, prefix="piece", workers=1)
+
+    assert gc.isenabled()
+    assert dumped(converted) == json.dumps(legacy(converted), cls=LegacyJsonEncoder)
+
+
+def test_packed_and_unpacked_segments_serialize_alike():
+    packed = PathDto(PathFlagsDto(open=True), PointDto(1, 2), [
+        OutlineLineDto(LineSegments([3, 4, -5, 6])),
+        OutlineBezierDto(BezierSegments([1, 2, 3, 4, 5, 6])),
+    ])
+    unpacked = PathDto(packed.flags, packed.start, [
+        OutlineLineDto(list(packed.outlines[0].segments)),
+        OutlineBezierDto(list(packed.outlines[1].segments)),
+    ])
+
+    assert dumped(packed) == dumped(unpacked) == json.dumps(legacy(packed), cls=LegacyJsonEncoder)
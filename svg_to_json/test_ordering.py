@@ -0,0 +1,47 @@
+import math
+import random
+
+import pytest
+
+from fcm import LineSegments, OutlineLineDto, PathDto, PathFlagsDto, PointDto
+from ordering import improve_order, order_greedy, path_end, travel_length
+
+
+def random_paths(seed: int, count: int, extent: int) -> list[PathDto]:
+    rng = random.Random(seed)
+    return [
+        PathDto(PathFlagsDto(), PointDto(rng.randrange(extent), rng.randrange(extent)), [
+            OutlineLineDto(LineSegments([rng.randrange(extent), rng.randrange(extent)])),
+        ])
+        for _ in range(count)
+    ]
+
+
+def legacy_order(paths: list[PathDto]) -> list[PathDto]:
+    paths = sorted(paths, key=lambda path: path.start.y)
+    ordered = [paths[0]]
+    paths = paths[1:]
+    while len(paths) > 0:
+        last = path_end(ordered[-1])
+        p = min(paths, key=lambda el: math.sqrt(math.pow(last.x - el.start.x, 2) + math.pow((last.y - el.start.y) * 10, 2)))
+        paths.remove(p)
+        ordered.append(p)
+    return ordered
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("count, extent", [(1, 10), (50, 20), (400, 100000)])
+def test_grid_order_matches_nearest_neighbour_order(seed, count, extent):
+    paths = random_paths(seed, count, extent)
+    assert [id(path) for path in order_greedy(paths)] == [id(path) for path in legacy_order(paths)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_improved_order_never_travels_further(seed):
+    paths = order_greedy(random_paths(seed, 400, 100000))
+
+    improved = improve_order(paths, 10)
+
+    assert improved[0] is paths[0]
+    assert sorted(map(id, improved)) == sorted(map(id, paths))
+    assert travel_length(improved) <= travel_length(paths)
@@ -0,0 +1,80 @@
+import math
+import random
+
+import pytest
+
+from fcm import BezierSegments, LineSegments, OutlineBezierDto, OutlineLineDto, PathDto, PathFlagsDto, PointDto, \
+    SegmentBezierDto
+from simplify import bezier, segment_distance, simplify_paths
+
+SPACING = 32
+
+
+def noisy_circle(seed: int, radius: float, count: int, noise: float = 1) -> list[int]:
+    rng = random.Random(seed)
+    coordinates = []
+    for i in range(1, count + 1):
+        angle = 2 * math.pi * i / count
+        coordinates += [
+            round(radius * math.cos(angle) + rng.uniform(-noise, noise)),
+            round(radius * math.sin(angle) + rng.uniform(-noise, noise)),
+        ]
+    return coordinates
+
+
+def line_path(seed: int, tolerance: float) -> PathDto:
+    coordinates = noisy_circle(seed, radius=3000, count=300, noise=seed / 2)
+    return PathDto(PathFlagsDto(), PointDto(coordinates[-2], coordinates[-1]), [OutlineLineDto(LineSegments(coordinates))])
+
+
+def bent_path(seed: int, tolerance: float) -> PathDto:
+    rng = random.Random(seed)
+    coordinates = noisy_circle(seed, radius=1000, count=60)
+    start = (coordinates[-2], coordinates[-1])
+    curves = []
+    for (x, y) in zip(coordinates[0::2], coordinates[1::2]):
+        for t in (1 / 3, 2 / 3):
+            curves += [
+                round(start[0] + (x - start[0]) * t + rng.uniform(-tolerance, tolerance)),
+                round(start[1] + (y - start[1]) * t + rng.uniform(-tolerance, tolerance)),
+            ]
+        curves += [x, y]
+        start = (x, y)
+    return PathDto(PathFlagsDto(), PointDto(coordinates[-2], coordinates[-1]), [OutlineBezierDto(BezierSegments(curves))])
+
+
+def sampled(path: PathDto) -> list[tuple[float, float]]:
+    points = [(path.start.x, path.start.y)]
+    for outline in path.outlines:
+        for segment in outline.segments:
+            end = (segment.end.x, segment.end.y)
+            if isinstance(segment, SegmentBezierDto):
+                curve = (points[-1], (segment.control1.x, segment.control1.y), (segment.control2.x, segment.control2.y), end)
+                samples = math.ceil(sum(math.dist(a, b) for (a, b) in zip(curve, curve[1:])) / SPACING) + 1
+                points += [bezier(curve, i / samples) for i in range(1, samples)]
+            points.append(end)
+    return points
+
+
+def deviation(path: PathDto, simplified: PathDto) -> float:
+    original, result = sampled(path), sampled(simplified)
+    return max(
+        max(min(segment_distance(point, a, b) for (a, b) in zip(result, result[1:])) for point in original),
+        max(min(segment_distance(point, a, b) for (a, b) in zip(original, original[1:])) for point in result),
+    )
+
+
+@pytest.mark.parametrize("tolerance", [0.5, 1, 2, 5])
+@pytest.mark.parametrize("fit_curves", [False, True])
+@pytest.mark.parametrize("make_path", [line_path, bent_path])
+def test_simplified_paths_stay_within_tolerance(make_path, fit_curves, tolerance):
+    for seed in range(2):
+        path = make_path(seed, tolerance)
+        (simplified,), before, after = simplify_paths([path], tolerance, fit_curves)
+        assert after <= before
+        assert deviation(path, simplified) <= tolerance
+
+
+def test_smooth_runs_become_cubics():
+    (simplified,), _, _ = simplify_paths([line_path(0, 2)], 2, True)
+    assert any(isinstance(outline, OutlineBezierDto) for outline in simplified.outlines)
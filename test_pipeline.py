@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import pipeline
+from inkscape import InkscapePool
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+STUB = [sys.executable, os.path.join(ROOT, "preprocess", "inkscape_stub.py")]
+DESIGN = """<svg xmlns="http://www.w3.org/2000/svg" width="210mm" height="297mm" viewBox="0 0 210 297">
+<g id="cut"><path d="M 10 10 L 50 10 Q 60 30 50 50 T 30 70 Z M 70 20 C 80 10 90 30 100 20 S 120 40 110 60 H 70 Z"/></g>
+<g id="cut_kiss"><rect x="60" y="120" width="40" height="25" rx="4"/><circle cx="150" cy="80" r="20"/></g>
+<g id="cut_die"><g transform="rotate(15 150 200)"><path d="m 120 180 l 60 0 a 10 10 0 0 1 0 40 v 20 h -60 z"/></g></g>
+</svg>
+"""
+SCAN = """
+import sys
+import cv2
+import numpy
+from benchmark import Case, Distortion, render_scan
+from main import DetectionParameters
+image, _ = render_scan(Case(300, "double", Distortion(rotation=0.5)), DetectionParameters(), numpy.random.default_rng(7))
+cv2.imwrite(sys.argv[1], image)
+"""
+
+
+@pytest.fixture(scope="module")
+def workspace(tmp_path_factory) -> tuple[str, str]:
+    directory = tmp_path_factory.mktemp("pipeline")
+    source = directory / "design.svg"
+    source.write_text(DESIGN)
+    scan = directory / "scan.png"
+    subprocess.run([sys.executable, "-c", SCAN, str(scan)], cwd=os.path.join(ROOT, "align"), check=True)
+    return str(source), str(scan)
+
+
+@pytest.fixture
+def tools() -> pipeline.Tools:
+    return pipeline.Tools(align=[sys.executable, "main.py", "--no-cache"], converter=shutil.which("cp"))
+
+
+def outputs(source: str, results: list[pipeline.LayerResult]) -> dict[str, str]:
+    assert [(result.layer, result.error) for result in results] == [(layer, None) for layer in pipeline.LAYERS]
+    contents = {}
+    for layer in pipeline.LAYERS:
+        with open(pipeline.layer_output(source, layer)) as reader:
+            contents[layer] = reader.read()
+    return contents
+
+
+def test_cached_design_matches_per_scan_route(workspace, tools, tmp_path):
+    source, scan = workspace
+    pool = InkscapePool(2, STUB)
+    try:
+        direct = outputs(source, pipeline.process_design(source, scan, tools=tools, pool=pool, native=True))
+        cache = pipeline.DesignCache(str(tmp_path / "cache"))
+        design = pipeline.prepare_design(source, tools=tools, pool=pool, native=True, cache=cache)
+        cached = outputs(source, pipeline.apply_scan(design, scan, tools))
+        reloaded = pipeline.prepare_design(source, tools=tools, pool=pool, native=True, cache=cache)
+        assert reloaded == design
+    finally:
+        pool.close()
+    assert cached == direct
+
+
+def test_scan_matrix_uses_svg_precision(workspace, tools):
+    source, scan = workspace
+    matrix = pipeline.scan_matrix(source, scan, tools)
+    assert len(matrix) == 6
+    assert all(round(value, 6) == value for value in matrix)
@@ -0,0 +1,184 @@
+import base64
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import service
+from pipeline import Tools
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+STUB = [sys.executable, os.path.join(ROOT, "preprocess", "inkscape_stub.py")]
+DESIGN = """<svg xmlns="http://www.w3.org/2000/svg" width="210mm" height="297mm" viewBox="0 0 210 297">
+<g id="cut"><path d="M 10 10 L 50 10 Q 60 30 50 50 T 30 70 Z"/></g>
+<g id="cut_kiss"><rect x="60" y="120" width="40" height="25" rx="4"/></g>
+<g id="cut_die"><circle cx="150" cy="80" r="20"/></g>
+</svg>
+"""
+SCAN = """
+import sys
+import cv2
+import numpy
+from benchmark import Case, Distortion, render_scan
+from main import DetectionParameters
+image, _ = render_scan(Case(300, "double", Distortion(rotation=0.5)), DetectionParameters(), numpy.random.default_rng(7))
+cv2.imwrite(sys.argv[1], image)
+"""
+EXPORT_DELAY = 0.5
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory) -> dict[str, str]:
+    directory = tmp_path_factory.mktemp("service")
+    scan = directory / "scan.png"
+    subprocess.run([sys.executable, "-c", SCAN, str(scan)], cwd=os.path.join(ROOT, "align"), check=True)
+    paths = {"scan": str(scan)}
+    for name in ("design", "slow"):
+        path = directory / (name + ".svg")
+        path.write_text(DESIGN.replace("<svg ", '<svg id="{0}" '.format(name)))
+        paths[name] = str(path)
+    return paths
+
+
+@pytest.fixture(scope="module")
+def output_root(tmp_path_factory) -> str:
+    return str(tmp_path_factory.mktemp("outputs"))
+
+
+@pytest.fixture(scope="module")
+def server(output_root):
+    os.environ["INKSCAPE_STUB_DELAY"] = str(EXPORT_DELAY)
+    try:
+        running = service.Service(
+            Tools(converter=shutil.which("cp")),
+            workers=1,
+            queue_size=1,
+            processes=2,
+            inkscape_workers=1,
+            inkscape=STUB,
+            native=True,
+            output_root=output_root,
+        )
+    finally:
+        del os.environ["INKSCAPE_STUB_DELAY"]
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), service.Handler)
+    httpd.service = running
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    running.close()
+
+
+def request(server, method: str, path: str, body: dict | None = None) -> tuple[int, dict]:
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=120)
+    try:
+        connection.request(method, path, json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def metrics(server) -> dict:
+    status, body = request(server, "GET", "/metrics")
+    assert status == 200
+    return body
+
+
+def test_health(server):
+    assert request(server, "GET", "/health") == (200, {"ok": True})
+    assert request(server, "GET", "/nothing")[0] == 404
+
+
+def test_job_returns_converted_layers_and_reuses_the_design(server, files):
+    status, body = request(server, "POST", "/jobs", {"design": files["design"], "scan": files["scan"]})
+    assert status == 200
+    assert len(body["matrix"]) == 6
+    assert [layer["layer"] for layer in body["layers"]] == ["cut", "cut_kiss", "cut_die"]
+    for layer in body["layers"]:
+        assert layer["ok"] and layer["error"] is None
+        assert len(json.loads(base64.b64decode(layer["fcm"]))["pieces"][0]["paths"]) > 0
+    exports = metrics(server)["inkscape"]["exports"]
+
+    status, again = request(server, "POST", "/jobs", {"design": files["design"], "scan": files["scan"]})
+    assert status == 200
+    assert again["layers"] == [dict(layer, seconds=repeated["seconds"]) for (layer, repeated) in zip(body["layers"], again["layers"])]
+    current = metrics(server)
+    assert current["inkscape"]["exports"] == exports
+    assert current["designs"]["hits"] >= 1
+    assert current["jobs"]["completed"] >= 2
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"scan": "scan.png"}, "missing 'design'"),
+    ({"design": "/nonexistent.svg", "scan": "/nonexistent.png"}, "nonexistent"),
+    ({"design": None, "scan": None, "layers": ["cut"]}, "not NoneType"),
+])
+def test_bad_requests_are_rejected(server, files, body, message):
+    status, response = request(server, "POST", "/jobs", body)
+    assert status == 400
+    assert message in response["error"]
+
+
+def test_outputs_are_written_inside_the_output_root(server, files, output_root):
+    job = {"design": files["design"], "scan": files["scan"], "layers": ["cut"], "output": "job"}
+    status, body = request(server, "POST", "/jobs", job)
+    assert status == 200
+    assert body["layers"][0]["output"] == os.path.join(output_root, "job", "design_cut.fcm")
+    assert os.path.isfile(body["layers"][0]["output"])
+
+
+@pytest.mark.parametrize("output", ["..", "/tmp", "job/../../elsewhere"])
+def test_outputs_outside_the_output_root_are_rejected(server, files, output):
+    job = {"design": files["design"], "scan": files["scan"], "output": output}
+    status, response = request(server, "POST", "/jobs", job)
+    assert status == 400
+    assert "output must be inside" in response["error"]
+
+
+def test_align_runs_in_spawned_workers():
+    matrix = (1.0, 0.0, 0.0, 1.0, 2.0, 3.0)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        assert executor.submit(service.align.svg_matrix, matrix).result() == service.align.svg_matrix(matrix)
+
+
+def test_unknown_layers_are_rejected(server, files):
+    status, response = request(server, "POST", "/jobs", {"design": files["design"], "scan": files["scan"], "layers": ["x"]})
+    assert status == 400
+    assert "layers" in response["error"]
+
+
+def test_full_queue_is_rejected(server, files):
+    job = {"design": files["slow"], "scan": files["scan"], "layers": ["cut", "cut_kiss", "cut_die"]}
+    replies = []
+    threads = [threading.Thread(target=lambda: replies.append(request(server, "POST", "/jobs", job))) for _ in range(2)]
+    threads[0].start()
+    deadline = time.monotonic() + 30
+    while metrics(server)["workers"]["busy"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    threads[1].start()
+    while metrics(server)["queue"]["depth"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    rejected = metrics(server)["jobs"]["rejected"]
+
+    status, body = request(server, "POST", "/jobs", job)
+
+    assert status == 503
+    assert body == {"error": "job queue is full"}
+    for thread in threads:
+        thread.join()
+    assert [status for (status, _) in replies] == [200, 200]
+    current = metrics(server)
+    assert current["jobs"]["rejected"] == rejected + 1
+    assert current["latency"]["total"]["count"] >= 2